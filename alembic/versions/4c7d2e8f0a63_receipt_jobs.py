@@ -0,0 +1,46 @@
+"""receipt jobs
+
+Revision ID: 4c7d2e8f0a63
+Revises: 9b3e5f7a1c48
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4c7d2e8f0a63"
+down_revision = "9b3e5f7a1c48"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "receipt_jobs",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("receipt_format", sa.String(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("rendered", sa.Integer(), nullable=False),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_receipt_jobs_created_at"), "receipt_jobs", ["created_at"], unique=False
+    )
+    op.create_index(
+        op.f("ix_receipt_jobs_user_id"), "receipt_jobs", ["user_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_receipt_jobs_user_id"), table_name="receipt_jobs")
+    op.drop_index(op.f("ix_receipt_jobs_created_at"), table_name="receipt_jobs")
+    op.drop_table("receipt_jobs")
@@ -0,0 +1,49 @@
+"""exact money columns
+
+Revision ID: 5d8f3b7a2e94
+Revises: c27b9e41d6a3
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5d8f3b7a2e94"
+down_revision = "c27b9e41d6a3"
+branch_labels = None
+depends_on = None
+
+MONEY_COLUMNS = {
+    "checks": ("payment_amount", "total", "rest"),
+    "products": ("price", "total"),
+}
+
+
+def upgrade() -> None:
+    for table, columns in MONEY_COLUMNS.items():
+        for column in columns:
+            # Stored floats are the nearest doubles to cent amounts, so
+            # rounding to two places recovers the amounts that were sent.
+            op.alter_column(
+                table,
+                column,
+                type_=sa.Numeric(12, 2),
+                existing_type=sa.Float(),
+                existing_nullable=False,
+                postgresql_using=f"round({column}::numeric, 2)",
+            )
+
+
+def downgrade() -> None:
+    for table, columns in MONEY_COLUMNS.items():
+        for column in columns:
+            op.alter_column(
+                table,
+                column,
+                type_=sa.Float(),
+                existing_type=sa.Numeric(12, 2),
+                existing_nullable=False,
+            )
@@ -0,0 +1,58 @@
+"""check listing indexes
+
+Revision ID: 8a4e6d0c5f21
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8a4e6d0c5f21"
+down_revision = "3f1c2a9d7b10"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps checks writable while the indexes build, but it
+    # cannot run inside the migration transaction.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_checks_user_id_created_at_id",
+            "checks",
+            ["user_id", "created_at", "id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_checks_user_id_payment_type_created_at_id",
+            "checks",
+            ["user_id", "payment_type", "created_at", "id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_products_check_id",
+            "products",
+            ["check_id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_products_check_id",
+            table_name="products",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_checks_user_id_payment_type_created_at_id",
+            table_name="checks",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_checks_user_id_created_at_id",
+            table_name="checks",
+            postgresql_concurrently=True,
+        )
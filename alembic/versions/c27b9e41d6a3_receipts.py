@@ -0,0 +1,33 @@
+"""receipts
+
+Revision ID: c27b9e41d6a3
+Revises: 8a4e6d0c5f21
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c27b9e41d6a3"
+down_revision = "8a4e6d0c5f21"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "receipts",
+        sa.Column("check_id", sa.Integer(), nullable=False),
+        sa.Column("template_digest", sa.String(), nullable=False),
+        sa.Column("html", sa.LargeBinary(), nullable=False),
+        sa.Column("text", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(["check_id"], ["checks.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("check_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("receipts")
@@ -0,0 +1,45 @@
+"""daily check totals
+
+Revision ID: e61a0b4c9d37
+Revises: 5d8f3b7a2e94
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e61a0b4c9d37"
+down_revision = "5d8f3b7a2e94"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "daily_check_totals",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("payment_type", sa.String(), nullable=False),
+        sa.Column("check_count", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "day", "payment_type"),
+    )
+    op.execute(
+        """
+        INSERT INTO daily_check_totals (
+            user_id, day, payment_type, check_count, total
+        )
+        SELECT user_id, created_at::date, payment_type, count(*), sum(total)
+        FROM checks
+        WHERE created_at IS NOT NULL
+        GROUP BY user_id, created_at::date, payment_type
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("daily_check_totals")
@@ -0,0 +1,106 @@
+"""Time GET /checks/ listing service calls on large pages.
+
+Seeds a scratch database with one user owning --checks checks of
+--products products each, then times get_filtered_checks for one page of
+--per-page checks, the way read_all calls it.
+
+    python -m benchmarks.check_listing postgresql://postgres@localhost/bench
+
+The database is dropped and recreated, never point it at real data.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.datastructures import URL
+
+import models
+from services.check_service import get_filtered_checks
+
+SEED = """
+INSERT INTO users (id, email, username, hashed_password, is_active)
+VALUES (1, 'bench@example.com', 'bench', '', true);
+
+INSERT INTO checks (
+    user_id, payment_type, buyer_name, payment_amount, total, rest, created_at
+)
+SELECT 1, 'cash', 'Bench buyer', 1000, 937.5, 62.5,
+    timestamp '2023-01-01' + g * interval '1 minute'
+FROM generate_series(1, :checks) AS g;
+
+INSERT INTO products (check_id, name, price, total, quantity)
+SELECT c.id, 'Product ' || p, 1.25, 1.25 * p, p
+FROM checks AS c, generate_series(1, :products) AS p
+ORDER BY c.id, p;
+"""
+
+
+def seed(database_url: str, checks: int, products: int):
+    engine = create_engine(database_url)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for statement in SEED.split(";\n"):
+            if statement.strip():
+                connection.execute(
+                    text(statement), {"checks": checks, "products": products}
+                )
+        connection.execute(text("ANALYZE"))
+    engine.dispose()
+
+
+async def run(database_url: str, per_page: int, repeat: int) -> list:
+    engine = create_async_engine(
+        database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    )
+    session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
+    filters = {
+        "page": 1,
+        "per_page": per_page,
+        "cursor": "",
+        "total_from": 0,
+        "date_from": "",
+        "date_to": "",
+        "payment_type": "",
+        "include_count": False,
+    }
+    url = URL("http://localhost:8000/checks/")
+
+    timings = []
+    for _ in range(repeat):
+        async with session_maker() as db:
+            started_at = time.perf_counter()
+            response = await get_filtered_checks(
+                filters=filters, user_id=1, url=url, db=db
+            )
+            timings.append((time.perf_counter() - started_at) * 1000)
+    assert len(response["checks"]) == per_page
+
+    await engine.dispose()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database_url")
+    parser.add_argument("--checks", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--per-page", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(args.database_url, checks=args.checks, products=args.products)
+    timings = asyncio.run(run(args.database_url, args.per_page, args.repeat))
+
+    print(
+        f"get_filtered_checks per_page={args.per_page} products={args.products}: "
+        f"median {statistics.median(timings):.1f} ms, min {min(timings):.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Measure worker cold start: a fresh interpreter importing and starting the app.
+
+Each run spawns a new Python process that imports main and runs the app's
+lifespan startup, the way a new uvicorn worker does, and reports the wall
+time from spawn to ready. Runs against the configured database.
+
+    python -m benchmarks.cold_start --runs 10
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+STARTUP = """
+import asyncio
+from main import app
+
+async def start():
+    async with app.router.lifespan_context(app):
+        pass
+
+asyncio.run(start())
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        started_at = time.perf_counter()
+        subprocess.run([sys.executable, "-c", STARTUP], check=True)
+        timings.append((time.perf_counter() - started_at) * 1000)
+
+    print(
+        f"cold start over {args.runs} runs: median {statistics.median(timings):.0f} ms, "
+        f"min {min(timings):.0f} ms, max {max(timings):.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
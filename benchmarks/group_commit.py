@@ -0,0 +1,60 @@
+"""Compare POST /checks/ throughput with and without group commit.
+
+Runs the create_check scenario of benchmarks.load twice in-process, once
+committing every check in its own transaction and once through the group
+commit writer (GROUP_COMMIT_ENABLED), and reports both. The gain grows
+with --concurrency and with the cost of a WAL flush on the database, so
+run it against a scratch database on the same kind of storage as
+production (ENVIRONMENT=QA and QA_DATABASE_URL).
+
+    python -m benchmarks.group_commit --concurrency 50
+    python -m benchmarks.group_commit --save benchmarks/group_commit_baseline.json
+"""
+
+import argparse
+import asyncio
+
+from httpx import AsyncClient
+
+from benchmarks.load import LoadSession, run_scenario
+from benchmarks.report import add_baseline_arguments, report
+from config import Config
+from main import app
+
+MODES = {"create_check": False, "create_check_group_commit": True}
+
+
+async def run_mode(group_commit: bool, args) -> dict:
+    Config.GROUP_COMMIT_ENABLED = group_commit
+    async with app.router.lifespan_context(app), AsyncClient(
+        app=app, base_url="http://localhost:8000"
+    ) as client:
+        session = LoadSession(client)
+        await session.start(checks=1)
+        try:
+            await run_scenario(session.create_check, args.warmup, args.concurrency)
+            return await run_scenario(
+                session.create_check, args.requests, args.concurrency
+            )
+        finally:
+            await session.stop()
+
+
+async def run(args) -> dict:
+    return {name: await run_mode(enabled, args) for name, enabled in MODES.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=50)
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    summaries = asyncio.run(run(args))
+    raise SystemExit(report(args, summaries))
+
+
+if __name__ == "__main__":
+    main()
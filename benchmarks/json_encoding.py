@@ -0,0 +1,79 @@
+"""Compare default and orjson encoding of a GET /checks/ listing.
+
+Builds a listing payload shaped like get_filtered_checks output and times
+the default FastAPI path (jsonable_encoder + JSONResponse) against
+FastJSONResponse, checking that both decode to the same data.
+
+    python -m benchmarks.json_encoding --per-page 500 --products 50
+"""
+
+import argparse
+import datetime
+import json
+import timeit
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from utils.responses import FastJSONResponse
+
+
+def build_listing(per_page: int, products: int) -> dict:
+    created_at = datetime.datetime(2023, 8, 19, 10, 5, 1, 123456)
+
+    return {
+        "total_count": per_page,
+        "next_cursor": "WyIyMDIzLTA4LTE5VDEwOjA1OjAxIiwgNTAwXQ==",
+        "checks": [
+            {
+                "check_id": check_id,
+                "payment_type": "cash",
+                "payment_amount": Decimal("1000.00"),
+                "total": Decimal("937.50"),
+                "rest": Decimal("62.50"),
+                "comment": "Please, be happy!",
+                "buyer_name": "FOP Bench",
+                "created_at": created_at + datetime.timedelta(minutes=check_id),
+                "url": f"http://localhost:8000/checks/{check_id}/{'a' * 64}/",
+                "products": [
+                    {
+                        "product_id": check_id * products + product_id,
+                        "name": f"Product {product_id}",
+                        "price": Decimal("0.10") * product_id,
+                        "quantity": product_id,
+                        "total": Decimal("0.10") * product_id * product_id,
+                    }
+                    for product_id in range(products)
+                ],
+            }
+            for check_id in range(per_page)
+        ],
+    }
+
+
+def encode_default(content) -> bytes:
+    return JSONResponse(content=jsonable_encoder(content)).body
+
+
+def encode_orjson(content) -> bytes:
+    return FastJSONResponse(content=content).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--per-page", type=int, default=500)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    content = build_listing(args.per_page, args.products)
+    assert json.loads(encode_default(content)) == json.loads(encode_orjson(content))
+
+    for name, encode in (("default", encode_default), ("orjson", encode_orjson)):
+        timings = timeit.repeat(lambda: encode(content), number=1, repeat=args.repeat)
+        print(f"{name:<8} min {min(timings) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Show how the check listing indexes change the query plans.
+
+Seeds a scratch database with users, checks and products, then runs
+EXPLAIN (ANALYZE, BUFFERS) on the listing, cursor and count queries built
+by services.check_service, first without and then with the indexes added
+by the 8a4e6d0c5f21 migration.
+
+    python -m benchmarks.listing_indexes postgresql://postgres@localhost/bench
+
+The database is dropped and recreated, never point it at real data.
+"""
+
+import argparse
+import datetime
+import re
+import time
+
+from sqlalchemy import asc, create_engine, func, select, text, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import joinedload
+
+import models
+from services.check_service import get_check_conditions
+
+LISTING_INDEXES = (
+    "ix_checks_user_id_created_at_id",
+    "ix_checks_user_id_payment_type_created_at_id",
+    "ix_products_check_id",
+)
+
+SEED_USERS = """
+INSERT INTO users (email, username, hashed_password, is_active)
+SELECT 'bench_' || g || '@example.com', 'bench_' || g, '', true
+FROM generate_series(1, :users) AS g
+"""
+
+SEED_CHECKS = """
+INSERT INTO checks (
+    user_id, payment_type, buyer_name, payment_amount, total, rest, created_at
+)
+SELECT
+    1 + g % :users,
+    CASE WHEN g % 3 = 0 THEN 'cashless' ELSE 'cash' END,
+    'Bench buyer',
+    100,
+    g % 100,
+    100 - g % 100,
+    timestamp '2023-01-01' + g::float / :checks * interval '365 days'
+FROM generate_series(1, :checks) AS g
+"""
+
+SEED_PRODUCTS = """
+INSERT INTO products (check_id, name, price, total, quantity)
+SELECT c.id, 'Product ' || p, 1.5, 1.5 * p, p
+FROM checks AS c, generate_series(1, :products_per_check) AS p
+"""
+
+
+def compile_query(query) -> str:
+    return str(
+        query.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def build_queries(user_id: int, per_page: int) -> dict:
+    filters = {
+        "total_from": "7",
+        "payment_type": "cash",
+        "date_from": "01/02/2023",
+        "date_to": "",
+    }
+    conditions = get_check_conditions(filters, user_id)
+    listing = (
+        select(models.Checks)
+        .filter(*conditions)
+        .order_by(asc(models.Checks.created_at), asc(models.Checks.id))
+    )
+    cursor = tuple_(models.Checks.created_at, models.Checks.id) > tuple_(
+        datetime.datetime(2023, 6, 1), 0
+    )
+
+    return {
+        "first page": compile_query(
+            listing.limit(per_page + 1).options(joinedload(models.Checks.products))
+        ),
+        "cursor page": compile_query(
+            listing.filter(cursor)
+            .limit(per_page + 1)
+            .options(joinedload(models.Checks.products))
+        ),
+        "count": compile_query(
+            select(func.count()).select_from(models.Checks).filter(*conditions)
+        ),
+    }
+
+
+def explain(connection, queries: dict) -> dict:
+    timings = {}
+    for name, sql in queries.items():
+        plan = connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"))
+        plan = [row[0] for row in plan]
+        timings[name] = float(
+            re.search(r"Execution Time: ([\d.]+) ms", plan[-1]).group(1)
+        )
+        print(f"--- {name}")
+        print("\n".join(plan))
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("database_url")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--checks", type=int, default=10_000_000)
+    parser.add_argument("--products-per-check", type=int, default=1)
+    parser.add_argument("--per-page", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as connection:
+        for index in LISTING_INDEXES:
+            connection.execute(text(f"DROP INDEX {index}"))
+
+        started_at = time.perf_counter()
+        params = {
+            "users": args.users,
+            "checks": args.checks,
+            "products_per_check": args.products_per_check,
+        }
+        for statement in (SEED_USERS, SEED_CHECKS, SEED_PRODUCTS):
+            connection.execute(text(statement), params)
+        print(f"Seeded in {time.perf_counter() - started_at:.1f}s")
+
+    queries = build_queries(user_id=args.users // 2, per_page=args.per_page)
+    with engine.connect() as connection:
+        connection.execute(text("ANALYZE"))
+        print("===== without listing indexes")
+        before = explain(connection, queries)
+
+    with engine.begin() as connection:
+        for table in (models.Checks.__table__, models.Products.__table__):
+            for index in table.indexes:
+                if index.name in LISTING_INDEXES:
+                    index.create(bind=connection)
+        connection.execute(text("ANALYZE"))
+
+    with engine.connect() as connection:
+        print("===== with listing indexes")
+        after = explain(connection, queries)
+
+    print(f"\n{'query':<12} {'before ms':>12} {'after ms':>12}")
+    for name in queries:
+        print(f"{name:<12} {before[name]:>12.2f} {after[name]:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
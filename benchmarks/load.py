@@ -0,0 +1,148 @@
+"""Load the API in-process and report latency percentiles and RPS.
+
+Drives the ASGI app through httpx, without a server or network, with
+--concurrency clients sending --requests requests per scenario:
+
+    login         POST /login/
+    create_check  POST /checks/
+    list_checks   GET /checks/
+    view_check    GET /checks/{check_id}/{signature}/
+
+The app uses the database from the environment, so point it at a scratch
+one (ENVIRONMENT=QA and QA_DATABASE_URL). A throwaway user is created for
+the run and deleted afterwards, together with its checks.
+
+    python -m benchmarks.load --save benchmarks/load_baseline.json
+    python -m benchmarks.load --compare benchmarks/load_baseline.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+import uuid
+
+from httpx import AsyncClient
+
+from benchmarks.report import add_baseline_arguments, report, summarize
+from main import app
+
+SCENARIOS = ("login", "create_check", "list_checks", "view_check")
+
+ORDER = {
+    "products": [
+        {"name": "Phone", "price": 10.0, "quantity": 1},
+        {"name": "Banana", "price": 0.5, "quantity": 10},
+        {"name": "Apple", "price": 0.75, "quantity": 5},
+    ],
+    "payment": {"type": "cash", "amount": 30.0},
+    "comment": "Load test",
+    "buyer_name": "FOP Load",
+}
+
+
+class LoadSession:
+    """A throwaway user and the requests each scenario sends on its behalf."""
+
+    def __init__(self, client: AsyncClient):
+        self.client = client
+        name = f"load_{uuid.uuid4().hex[:12]}"
+        self.credentials = {"username": name, "password": name}
+        self.email = f"{name}@example.com"
+        self.headers = {}
+        self.check_urls = itertools.cycle([])
+
+    async def start(self, checks: int):
+        response = await self.client.post(
+            "/sign-up/", json={**self.credentials, "email": self.email}
+        )
+        response.raise_for_status()
+        response = await self.client.post("/login/", data=self.credentials)
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        response = await self.client.post(
+            "/checks/batch", json=[ORDER] * checks, headers=self.headers
+        )
+        response.raise_for_status()
+        response = await self.client.get(
+            "/checks/", params={"per_page": checks}, headers=self.headers
+        )
+        response.raise_for_status()
+        self.check_urls = itertools.cycle(
+            [check["url"] for check in response.json()["checks"]]
+        )
+
+    async def stop(self):
+        await self.client.delete("/unsubscribe/", headers=self.headers)
+
+    def login(self):
+        return self.client.post("/login/", data=self.credentials)
+
+    def create_check(self):
+        return self.client.post("/checks/", json=ORDER, headers=self.headers)
+
+    def list_checks(self):
+        return self.client.get(
+            "/checks/", params={"per_page": 50}, headers=self.headers
+        )
+
+    def view_check(self):
+        return self.client.get(next(self.check_urls))
+
+
+async def run_scenario(send, requests: int, concurrency: int) -> dict:
+    timings = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started_at = time.perf_counter()
+            response = await send()
+            timings.append(time.perf_counter() - started_at)
+            response.raise_for_status()
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return summarize(timings, elapsed=time.perf_counter() - started_at)
+
+
+async def run(args) -> dict:
+    summaries = {}
+    async with app.router.lifespan_context(app), AsyncClient(
+        app=app, base_url="http://localhost:8000"
+    ) as client:
+        session = LoadSession(client)
+        await session.start(checks=args.checks)
+        try:
+            for name in args.scenarios:
+                send = getattr(session, name)
+                await run_scenario(send, args.warmup, args.concurrency)
+                summaries[name] = await run_scenario(
+                    send, args.requests, args.concurrency
+                )
+        finally:
+            await session.stop()
+
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--checks", type=int, default=100, help="checks to view")
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    summaries = asyncio.run(run(args))
+    raise SystemExit(report(args, summaries))
+
+
+if __name__ == "__main__":
+    main()
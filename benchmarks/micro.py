@@ -0,0 +1,100 @@
+"""Micro-benchmarks of the per-check hot paths.
+
+Times serialize_check, generate_signature (cached and uncached) and the
+rendering of the HTML (Jinja), text and ESC/POS receipts on a synthetic
+check, without touching the database. Run it from the repository root so
+the templates are found.
+
+    python -m benchmarks.micro --save benchmarks/micro_baseline.json
+    python -m benchmarks.micro --compare benchmarks/micro_baseline.json
+"""
+
+import argparse
+import datetime
+import itertools
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from benchmarks.report import add_baseline_arguments, report, summarize
+from services.check_service import generate_signature, serialize_check
+from services.receipt_service import render_receipt
+from utils.thermal_receipt import render_escpos_receipt, render_text_receipt
+
+URL_PREFIX = "http://localhost:8000/checks/"
+
+
+def build_check(products: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=1,
+        payment_type="cash",
+        payment_amount=Decimal("1000.00"),
+        total=Decimal("937.50"),
+        rest=Decimal("62.50"),
+        comment="Please, be happy!",
+        buyer_name="FOP Bench",
+        created_at=datetime.datetime(2023, 8, 19, 10, 5, 1),
+        products=[
+            SimpleNamespace(
+                name=f"Product {product_id}",
+                price=Decimal("1.25"),
+                quantity=product_id,
+                total=Decimal("1.25") * product_id,
+            )
+            for product_id in range(1, products + 1)
+        ],
+    )
+
+
+def build_benchmarks(products: int) -> dict:
+    check = build_check(products)
+    product_rows = [product.__dict__ for product in check.products]
+    check_ids = itertools.count(1)
+
+    return {
+        "serialize_check": lambda: serialize_check(URL_PREFIX, check, product_rows),
+        "generate_signature": lambda: generate_signature(check.id),
+        "generate_signature_cold": lambda: generate_signature.__wrapped__(
+            next(check_ids)
+        ),
+        "render_receipt": lambda: render_receipt(check),
+        "render_text_receipt": lambda: render_text_receipt(check),
+        "render_escpos_receipt": lambda: render_escpos_receipt(check),
+    }
+
+
+def measure(func, number: int, repeat: int) -> list:
+    """Time repeat samples of number calls and return seconds per call."""
+    for _ in range(number):
+        func()
+
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started_at) / number)
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10)
+    parser.add_argument("--number", type=int, default=200, help="calls per sample")
+    parser.add_argument("--repeat", type=int, default=50, help="samples")
+    parser.add_argument("--only", nargs="+", help="benchmark names to run")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    summaries = {}
+    for name, func in build_benchmarks(args.products).items():
+        if args.only and name not in args.only:
+            continue
+        summaries[name] = summarize(measure(func, args.number, args.repeat))
+
+    raise SystemExit(report(args, summaries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Compare receipt rendering paths for the signed check URL.
+
+Times the Jinja TemplateResponse path that used to serve receipts, the
+cached-template Jinja render used now, and the fixed-width text and ESC/POS
+renderers, on synthetic checks of --products products.
+
+    python -m benchmarks.receipt_rendering --products 10 50
+"""
+
+import argparse
+
+from starlette.requests import Request
+
+from benchmarks.micro import build_check, measure
+from benchmarks.report import add_baseline_arguments, report, summarize
+from services.receipt_service import RECEIPT_TEMPLATE, render_receipt, templates
+from utils.thermal_receipt import render_escpos_receipt, render_text_receipt
+
+REQUEST = Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+
+
+def render_template_response(check) -> bytes:
+    return templates.TemplateResponse(
+        RECEIPT_TEMPLATE, {"request": REQUEST, "check": check}
+    ).body
+
+
+RENDERERS = {
+    "template_response": render_template_response,
+    "jinja_html": render_receipt,
+    "text": render_text_receipt,
+    "escpos": render_escpos_receipt,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--number", type=int, default=200, help="calls per sample")
+    parser.add_argument("--repeat", type=int, default=30, help="samples")
+    add_baseline_arguments(parser)
+    args = parser.parse_args()
+
+    summaries = {}
+    for products in args.products:
+        check = build_check(products)
+        for name, render in RENDERERS.items():
+            timings = measure(lambda: render(check), args.number, args.repeat)
+            summaries[f"{name}[{products}]"] = summarize(timings)
+
+    raise SystemExit(report(args, summaries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Latency summaries and baseline files shared by the benchmarks.
+
+A baseline is a JSON object mapping a benchmark name to its summary. Compare
+mode flags every benchmark whose p50 or p95 got slower, or whose RPS got
+lower, by more than the tolerance.
+"""
+
+import json
+import statistics
+from typing import Optional
+
+COMPARED_METRICS = {"p50_ms": 1, "p95_ms": 1, "rps": -1}
+
+
+def summarize(timings: list, elapsed: Optional[float] = None) -> dict:
+    """Summarize per-call timings in seconds.
+
+    elapsed is the wall time of the whole run; without it RPS assumes the
+    calls ran one after another.
+    """
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    elapsed = elapsed if elapsed is not None else sum(timings)
+
+    return {
+        "count": len(timings),
+        "p50_ms": round(cuts[49] * 1000, 6),
+        "p95_ms": round(cuts[94] * 1000, 6),
+        "p99_ms": round(cuts[98] * 1000, 6),
+        "max_ms": round(max(timings) * 1000, 6),
+        "rps": round(len(timings) / elapsed, 1),
+    }
+
+
+def print_summaries(summaries: dict):
+    print(
+        f"{'benchmark':<24} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} "
+        f"{'p99 ms':>10} {'rps':>10}"
+    )
+    for name, summary in summaries.items():
+        print(
+            f"{name:<24} {summary['count']:>7} {summary['p50_ms']:>10.4f} "
+            f"{summary['p95_ms']:>10.4f} {summary['p99_ms']:>10.4f} "
+            f"{summary['rps']:>10.1f}"
+        )
+
+
+def save_baseline(path: str, summaries: dict):
+    with open(path, "w") as baseline:
+        json.dump(summaries, baseline, indent=2, sort_keys=True)
+
+
+def compare_with_baseline(path: str, summaries: dict, tolerance: float) -> list:
+    """Print the change against a saved baseline and return the regressions."""
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    regressions = []
+    print(
+        f"\n{'benchmark':<24} {'metric':>8} {'baseline':>10} {'now':>10} {'change':>8}"
+    )
+    for name, summary in summaries.items():
+        if name not in baseline:
+            continue
+        for metric, direction in COMPARED_METRICS.items():
+            before, after = baseline[name][metric], summary[metric]
+            change = (after - before) / before if before else 0
+            flag = ""
+            if change * direction > tolerance:
+                regressions.append(f"{name} {metric}")
+                flag = "  REGRESSION"
+            print(
+                f"{name:<24} {metric:>8} {before:>10.4f} {after:>10.4f} "
+                f"{change:>+8.1%}{flag}"
+            )
+
+    return regressions
+
+
+def add_baseline_arguments(parser):
+    parser.add_argument("--save", metavar="PATH", help="write results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare with a baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed relative slowdown before --compare fails (default 0.25)",
+    )
+
+
+def report(args, summaries: dict) -> int:
+    """Print, save and compare results as asked on the command line.
+
+    Returns the process exit code: 1 when --compare found a regression.
+    """
+    print_summaries(summaries)
+    if args.save:
+        save_baseline(args.save, summaries)
+    if args.compare:
+        regressions = compare_with_baseline(args.compare, summaries, args.tolerance)
+        if regressions:
+            print(f"\nRegressed: {', '.join(regressions)}")
+            return 1
+
+    return 0
@@ -0,0 +1,47 @@
+"""Rebuild the daily check totals used by GET /checks/stats.
+
+The rollups are kept up to date when checks are created, this is only
+needed to repair them, e.g. after checks were edited or imported directly
+in the database. Without options every rollup is rebuilt.
+
+    python -m commands.backfill_check_totals --user-id 1 --date-from 01/06/2023
+"""
+
+import argparse
+import asyncio
+import datetime
+
+from database import AsyncSessionLocal, dispose_async_engine
+from services.rollup_service import backfill_daily_check_totals
+
+
+def parse_date(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value, "%d/%m/%Y").date()
+
+
+async def run(args) -> int:
+    async with AsyncSessionLocal() as db:
+        rows = await backfill_daily_check_totals(
+            db=db,
+            user_id=args.user_id,
+            date_from=args.date_from,
+            date_to=args.date_to,
+        )
+    await dispose_async_engine()
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--date-from", type=parse_date, help="DD/MM/YYYY")
+    parser.add_argument("--date-to", type=parse_date, help="DD/MM/YYYY, inclusive")
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    print(f"Rebuilt {rows} daily check totals")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Delete Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL.
+
+Expired keys are already ignored and reused, this only reclaims their rows.
+Meant to run periodically, e.g. from cron.
+
+    python -m commands.purge_idempotency_keys
+"""
+
+import argparse
+import asyncio
+
+from database import AsyncSessionLocal, dispose_async_engine
+from services.idempotency_service import purge_idempotency_keys
+
+
+async def run() -> int:
+    async with AsyncSessionLocal() as db:
+        rows = await purge_idempotency_keys(db=db)
+    await dispose_async_engine()
+
+    return rows
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+
+    rows = asyncio.run(run())
+    print(f"Deleted {rows} expired idempotency keys")
+
+
+if __name__ == "__main__":
+    main()
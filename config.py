@@ -12,3 +12,48 @@ class Config:
     ADMIN_DB_PASSWORD = config("ADMIN_DB_PASSWORD")
     DB_HOST = config("DB_HOST")
     TOKEN_EXPIRATION_MINUTES = config("TOKEN_EXPIRATION_MINUTES")
+    DB_POOL_SIZE = config("DB_POOL_SIZE", default=20, cast=int)
+    DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", default=10, cast=int)
+    DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=30, cast=float)
+    DB_POOL_PRE_PING = config("DB_POOL_PRE_PING", default=False, cast=bool)
+    DB_POOL_RECYCLE = config("DB_POOL_RECYCLE", default=-1, cast=int)
+    DB_PGBOUNCER = config("DB_PGBOUNCER", default=False, cast=bool)
+    PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", default=4, cast=int)
+    PASSWORD_HASH_QUEUE_SIZE = config("PASSWORD_HASH_QUEUE_SIZE", default=64, cast=int)
+    CHECK_COUNT_CACHE_TTL = config("CHECK_COUNT_CACHE_TTL", default=30, cast=int)
+    CHECK_COUNT_CACHE_SIZE = config("CHECK_COUNT_CACHE_SIZE", default=10000, cast=int)
+    CHECK_BATCH_MAX_SIZE = config("CHECK_BATCH_MAX_SIZE", default=10000, cast=int)
+    RECEIPT_CACHE_SIZE = config("RECEIPT_CACHE_SIZE", default=1024, cast=int)
+    RECEIPT_CACHE_TTL = config("RECEIPT_CACHE_TTL", default=3600, cast=int)
+    RECEIPT_CACHE_BACKEND = config("RECEIPT_CACHE_BACKEND", default="")
+    RECEIPT_PRERENDER = config("RECEIPT_PRERENDER", default=False, cast=bool)
+    RECEIPT_PRERENDER_CHUNK_SIZE = config(
+        "RECEIPT_PRERENDER_CHUNK_SIZE", default=500, cast=int
+    )
+    SIGNATURE_CACHE_SIZE = config("SIGNATURE_CACHE_SIZE", default=65536, cast=int)
+    FAST_JSON_RESPONSES = config("FAST_JSON_RESPONSES", default=False, cast=bool)
+    CHECK_EXPORT_CHUNK_SIZE = config("CHECK_EXPORT_CHUNK_SIZE", default=1000, cast=int)
+    TOKEN_CACHE_SIZE = config("TOKEN_CACHE_SIZE", default=10000, cast=int)
+    METRICS_ENABLED = config("METRICS_ENABLED", default=False, cast=bool)
+    SERVER_TIMING_ENABLED = config("SERVER_TIMING_ENABLED", default=False, cast=bool)
+    SLOW_QUERY_THRESHOLD_MS = config("SLOW_QUERY_THRESHOLD_MS", default=0, cast=float)
+    DB_CREATE_ON_STARTUP = config("DB_CREATE_ON_STARTUP", default=True, cast=bool)
+    READINESS_PROBE_ENABLED = config(
+        "READINESS_PROBE_ENABLED", default=False, cast=bool
+    )
+    ADMIN_API_TOKEN = config("ADMIN_API_TOKEN", default="")
+    IDEMPOTENCY_KEY_TTL = config("IDEMPOTENCY_KEY_TTL", default=86400, cast=int)
+    IDEMPOTENCY_CACHE_SIZE = config("IDEMPOTENCY_CACHE_SIZE", default=10000, cast=int)
+    RECEIPT_RENDER_WORKERS = config("RECEIPT_RENDER_WORKERS", default=0, cast=int)
+    RECEIPT_JOB_CHUNK_SIZE = config("RECEIPT_JOB_CHUNK_SIZE", default=200, cast=int)
+    RECEIPT_JOB_DIR = config("RECEIPT_JOB_DIR", default="receipt_jobs")
+    RECEIPT_JOB_TTL = config("RECEIPT_JOB_TTL", default=86400, cast=int)
+    READ_DATABASE_URL = config("READ_DATABASE_URL", default="")
+    READ_REPLICA_MAX_LAG = config("READ_REPLICA_MAX_LAG", default=5.0, cast=float)
+    READ_REPLICA_CHECK_INTERVAL = config(
+        "READ_REPLICA_CHECK_INTERVAL", default=5.0, cast=float
+    )
+    GROUP_COMMIT_ENABLED = config("GROUP_COMMIT_ENABLED", default=False, cast=bool)
+    GROUP_COMMIT_MAX_BATCH = config("GROUP_COMMIT_MAX_BATCH", default=200, cast=int)
+    GROUP_COMMIT_WINDOW_MS = config("GROUP_COMMIT_WINDOW_MS", default=2.0, cast=float)
+    GROUP_COMMIT_QUEUE_SIZE = config("GROUP_COMMIT_QUEUE_SIZE", default=2000, cast=int)
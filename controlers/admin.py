@@ -0,0 +1,25 @@
+import hmac
+
+from fastapi import APIRouter, Depends, Header, status
+
+from config import Config
+from database import get_pool_status
+from utils.exceptions import get_user_exception
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    responses={401: {"user": "Not authorized"}},
+)
+
+
+async def verify_admin_token(x_admin_token: str = Header(default="")):
+    if not hmac.compare_digest(x_admin_token.encode(), Config.ADMIN_API_TOKEN.encode()):
+        raise get_user_exception()
+
+
+@router.get(
+    "/pool", status_code=status.HTTP_200_OK, dependencies=[Depends(verify_admin_token)]
+)
+async def read_pool_status():
+    return get_pool_status()
@@ -2,9 +2,8 @@ from datetime import timedelta
 
 from fastapi import APIRouter, Depends, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-import models
 from config import Config
 from schemas.auth_schema import CreateUser
 from services.auth_service import (
@@ -14,7 +13,8 @@ from services.auth_service import (
     delete_user,
     get_current_user,
 )
-from utils.exceptions import bad_request_exception, get_user_exception, token_exception
+from utils.exceptions import get_user_exception, token_exception
+from utils.responses import json_response
 from utils.utils import get_db
 
 router = APIRouter(
@@ -23,24 +23,18 @@ router = APIRouter(
 
 
 @router.post("/sign-up/", status_code=status.HTTP_201_CREATED)
-async def registration(user_data: CreateUser, db: Session = Depends(get_db)):
-    if db.query(models.Users).filter(models.Users.email == user_data.email).first():
-        raise bad_request_exception(detail="The email already exist")
-    if (
-        db.query(models.Users)
-        .filter(models.Users.username == user_data.username)
-        .first()
-    ):
-        raise bad_request_exception(detail="The username already exist")
-
+async def registration(user_data: CreateUser, db: AsyncSession = Depends(get_db)):
     user_id = await create_user(user_data=user_data, db=db)
 
-    return {"detail": "Created", "user_id": user_id}
+    return json_response(
+        {"detail": "Created", "user_id": user_id},
+        status_code=status.HTTP_201_CREATED,
+    )
 
 
 @router.delete("/unsubscribe/", status_code=status.HTTP_204_NO_CONTENT)
 async def unsubscribe(
-    db: Session = Depends(get_db), user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db), user: dict = Depends(get_current_user)
 ):
     if user is None:
         raise get_user_exception()
@@ -50,13 +44,13 @@ async def unsubscribe(
 
 @router.post("/login/", status_code=status.HTTP_200_OK)
 async def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
 ):
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise token_exception()
 
     token_expires = timedelta(minutes=int(Config.TOKEN_EXPIRATION_MINUTES))
     token = create_access_token(user.username, user.id, expires_delta=token_expires)
 
-    return {"access_token": token, "token_type": "bearer"}
+    return json_response({"access_token": token, "token_type": "bearer"})
@@ -1,46 +1,109 @@
-from fastapi import APIRouter, Depends, Query, Request, status
-from fastapi.templating import Jinja2Templates
+from typing import Optional
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import constr
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from schemas.check_schema import Order
+from config import Config
+from database import AsyncSessionLocal, get_write_lsn, is_read_replica
+from schemas.check_schema import Order, OrdersBatch
 from services.auth_service import get_current_user
 from services.check_service import (
     add_check_to_db,
+    add_checks_batch_to_db,
     generate_signature,
-    get_check_by_id,
+    get_check_url_prefix,
     get_filtered_checks,
 )
+from services.check_writer_service import check_writer
+from services.export_service import (
+    EXPORT_MEDIA_TYPES,
+    get_export_query,
+    stream_checks_export,
+)
+from services.idempotency_service import get_request_hash, reserve_idempotency_key
+from services.receipt_job_service import (
+    JOB_DONE,
+    create_receipt_job,
+    get_job_path,
+    get_receipt_job,
+    run_receipt_job,
+    serialize_receipt_job,
+)
+from services.receipt_service import (
+    RECEIPT_CACHE_CONTROL,
+    RECEIPT_MEDIA_TYPES,
+    get_receipt_etag,
+    get_rendered_receipt,
+    prerender_receipts,
+)
+from services.stats_service import get_check_stats
 from utils.exceptions import (
     bad_request_exception,
+    conflict_exception,
     get_user_exception,
     not_found_exception,
 )
-from utils.utils import get_db
+from utils.responses import json_response
+from utils.utils import (
+    get_db,
+    get_read_db,
+    get_request_write_lsn,
+    json_write_response,
+    set_write_lsn,
+)
 
 router = APIRouter(
     prefix="/checks", tags=["checks"], responses={404: {"description": "Not found"}}
 )
 
-templates = Jinja2Templates(directory="templates")
-
 
-@router.get("/", status_code=status.HTTP_200_OK)
-async def read_all(
-    request: Request,
-    db: Session = Depends(get_db),
-    user: dict = Depends(get_current_user),
-    page: int = Query(default=1, description="Page number"),
-    per_page: int = Query(default=5, description="Records per page"),
+def get_check_filters(
     total_from: constr(regex=r"^\d*([.,]\d*)?$") = Query(
         default=0, description="Minimal price"
     ),
     date_from: constr(regex=r"^\d{2}/\d{2}/\d{4}$") = Query(
         default="", description="DD/MM/YYYY"
     ),
+    date_to: constr(regex=r"^\d{2}/\d{2}/\d{4}$") = Query(
+        default="", description="DD/MM/YYYY, inclusive"
+    ),
     payment_type: constr(regex=r"^cash(less)?$") = Query(
         default="", description="'cash' or 'cashless'"
     ),
+) -> dict:
+    return {
+        "total_from": total_from,
+        "date_from": date_from,
+        "date_to": date_to,
+        "payment_type": payment_type,
+    }
+
+
+@router.get("/", status_code=status.HTTP_200_OK)
+async def read_all(
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    user: dict = Depends(get_current_user),
+    page: int = Query(default=1, ge=1, description="Page number"),
+    per_page: int = Query(default=5, ge=1, description="Records per page"),
+    cursor: str = Query(
+        default="", description="'next_cursor' of the previous page, overrides page"
+    ),
+    check_filters: dict = Depends(get_check_filters),
+    include_count: bool = Query(
+        default=True, description="Count all matching checks in 'total_count'"
+    ),
 ):
     if user is None:
         raise get_user_exception()
@@ -48,43 +111,254 @@ async def read_all(
     filters = {
         "page": page,
         "per_page": per_page,
-        "total_from": total_from,
-        "date_from": date_from,
-        "payment_type": payment_type,
+        "cursor": cursor,
+        "include_count": include_count,
+        **check_filters,
     }
 
     filtered_checks = await get_filtered_checks(
         filters=filters, user_id=user["id"], url=request.url, db=db
     )
 
-    return filtered_checks
+    return json_response(filtered_checks)
+
+
+@router.get("/stats", status_code=status.HTTP_200_OK)
+async def read_stats(
+    db: AsyncSession = Depends(get_read_db),
+    user: dict = Depends(get_current_user),
+    date_from: constr(regex=r"^\d{2}/\d{2}/\d{4}$") = Query(description="DD/MM/YYYY"),
+    date_to: constr(regex=r"^\d{2}/\d{2}/\d{4}$") = Query(
+        description="DD/MM/YYYY, inclusive"
+    ),
+    period: constr(regex=r"^(day|week|month)$") = Query(
+        default="day", description="'day', 'week' or 'month'"
+    ),
+    top_products: int = Query(
+        default=5,
+        ge=0,
+        le=50,
+        description="Best selling products per period, 0 reads only the rollups",
+    ),
+):
+    if user is None:
+        raise get_user_exception()
+
+    filters = {
+        "date_from": date_from,
+        "date_to": date_to,
+        "period": period,
+        "top_products": top_products,
+    }
+
+    stats = await get_check_stats(user_id=user["id"], filters=filters, db=db)
+
+    return json_response(stats)
+
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_checks(
+    request: Request,
+    user: dict = Depends(get_current_user),
+    check_filters: dict = Depends(get_check_filters),
+    export_format: constr(regex=r"^(ndjson|csv)$") = Query(
+        default="ndjson", alias="format", description="'ndjson' or 'csv'"
+    ),
+):
+    if user is None:
+        raise get_user_exception()
+
+    query = get_export_query(filters=check_filters, user_id=user["id"])
+
+    return StreamingResponse(
+        stream_checks_export(
+            query=query,
+            url=request.url,
+            export_format=export_format,
+            write_lsn=get_request_write_lsn(request),
+        ),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="checks.{export_format}"'
+        },
+    )
+
+
+@router.post("/receipts/bulk", status_code=status.HTTP_202_ACCEPTED)
+async def create_bulk_receipts(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    check_filters: dict = Depends(get_check_filters),
+    receipt_format: constr(regex=r"^(html|txt|escpos)$") = Query(
+        default="html", alias="format", description="html, txt or escpos"
+    ),
+):
+    if user is None:
+        raise get_user_exception()
+
+    job = await create_receipt_job(
+        filters=check_filters,
+        user_id=user["id"],
+        receipt_format=receipt_format,
+        db=db,
+    )
+    background_tasks.add_task(
+        run_receipt_job,
+        job_id=job.id,
+        filters=check_filters,
+        user_id=user["id"],
+        receipt_format=receipt_format,
+    )
+
+    return json_response(
+        serialize_receipt_job(job, get_check_url_prefix(request.url)),
+        status_code=status.HTTP_202_ACCEPTED,
+    )
+
+
+@router.get("/receipts/bulk/{job_id}", status_code=status.HTTP_200_OK)
+async def read_bulk_receipts(
+    request: Request,
+    job_id: str,
+    user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    if user is None:
+        raise get_user_exception()
+
+    job = await get_receipt_job(job_id=job_id, user_id=user["id"], db=db)
+    if job is None:
+        raise not_found_exception(detail="Receipt job not found")
+
+    return json_response(serialize_receipt_job(job, get_check_url_prefix(request.url)))
+
+
+@router.get("/receipts/bulk/{job_id}/download", status_code=status.HTTP_200_OK)
+async def download_bulk_receipts(
+    job_id: str,
+    user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    if user is None:
+        raise get_user_exception()
+
+    job = await get_receipt_job(job_id=job_id, user_id=user["id"], db=db)
+    if job is None:
+        raise not_found_exception(detail="Receipt job not found")
+    if job.status != JOB_DONE:
+        raise conflict_exception(detail=f"Receipt job is {job.status}")
+
+    return FileResponse(
+        get_job_path(job.id),
+        media_type="application/zip",
+        filename=f"receipts_{job.id}.zip",
+    )
 
 
 @router.get("/{check_id}/{signature}/", status_code=status.HTTP_200_OK)
 async def view_check(
-    request: Request, check_id: str, signature: str, db: Session = Depends(get_db)
+    request: Request,
+    check_id: str,
+    signature: str,
+    receipt_format: constr(regex=r"^(html|txt|escpos)$") = Query(
+        default="html", alias="format", description="html, txt or escpos"
+    ),
+    db: AsyncSession = Depends(get_read_db),
 ):
 
     expected_signature = generate_signature(check_id=check_id)
     if signature != expected_signature:
         raise bad_request_exception(detail="Invalid signature")
 
-    check = await get_check_by_id(check_id=check_id, db=db)
-    if not check:
+    headers = {
+        "ETag": get_receipt_etag(signature=signature, receipt_format=receipt_format),
+        "Cache-Control": RECEIPT_CACHE_CONTROL,
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match == "*" or headers["ETag"] in if_none_match.split(", "):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    receipt = await get_rendered_receipt(
+        check_id=check_id, db=db, receipt_format=receipt_format
+    )
+    if receipt is None and is_read_replica(db):
+        # The check may be newer than the replica's last replayed commit.
+        async with AsyncSessionLocal() as primary_db:
+            receipt = await get_rendered_receipt(
+                check_id=check_id, db=primary_db, receipt_format=receipt_format
+            )
+    if receipt is None:
         raise not_found_exception(detail="Check not found")
 
-    return templates.TemplateResponse(
-        "check/check.html", {"request": request, "check": check}
+    return Response(
+        content=receipt,
+        media_type=RECEIPT_MEDIA_TYPES[receipt_format],
+        headers=headers,
     )
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_check(
-    order: Order, user: dict = Depends(get_current_user), db: Session = Depends(get_db)
+    order: Order,
+    background_tasks: BackgroundTasks,
+    idempotency_key: Optional[str] = Header(default=None, min_length=1, max_length=255),
+    user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    if user is None:
+        raise get_user_exception()
+
+    if idempotency_key is not None:
+        stored_response = await reserve_idempotency_key(
+            user_id=user["id"],
+            key=idempotency_key,
+            request_hash=get_request_hash(order),
+            db=db,
+        )
+        if stored_response is not None:
+            response = Response(
+                content=stored_response,
+                status_code=status.HTTP_201_CREATED,
+                media_type="application/json",
+                headers={"Idempotent-Replayed": "true"},
+            )
+            # A retry after a lost response still needs read-after-write.
+            set_write_lsn(response, await get_write_lsn(db))
+            return response
+
+    if check_writer.running and idempotency_key is None:
+        response = await check_writer.add_check(order=order, user_id=user["id"])
+    else:
+        # The key is claimed in this request's transaction, which has to be
+        # the one that writes the check.
+        response = await add_check_to_db(
+            order=order, user_id=user["id"], db=db, idempotency_key=idempotency_key
+        )
+    if Config.RECEIPT_PRERENDER:
+        background_tasks.add_task(prerender_receipts, check_ids=[response["id"]])
+
+    return json_write_response(
+        response, await get_write_lsn(db), status_code=status.HTTP_201_CREATED
+    )
+
+
+@router.post("/batch", status_code=status.HTTP_201_CREATED)
+async def create_checks_batch(
+    orders: OrdersBatch,
+    background_tasks: BackgroundTasks,
+    user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     if user is None:
         raise get_user_exception()
 
-    response = await add_check_to_db(order=order, user_id=user["id"], db=db)
+    response = await add_checks_batch_to_db(orders=orders, user_id=user["id"], db=db)
+    if Config.RECEIPT_PRERENDER:
+        check_ids = [result["id"] for result in response["results"] if "id" in result]
+        background_tasks.add_task(prerender_receipts, check_ids=check_ids)
 
-    return response
+    return json_write_response(
+        response, await get_write_lsn(db), status_code=status.HTTP_201_CREATED
+    )
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, status
+from sqlalchemy import text
+
+from database import get_async_engine
+from utils.exceptions import service_unavailable_exception
+
+router = APIRouter(prefix="", tags=["health"])
+
+
+@router.get("/ready", status_code=status.HTTP_200_OK)
+async def read_readiness():
+    try:
+        async with get_async_engine().connect() as connection:
+            await connection.execute(text("SELECT 1"))
+    except Exception:
+        raise service_unavailable_exception(detail="Database is not reachable")
+
+    return {"status": "ready"}
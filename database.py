@@ -1,41 +1,286 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Optional
+
 import psycopg2
 from psycopg2 import sql
-from sqlalchemy import create_engine
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.concurrency import run_in_threadpool
 
 from config import Config
 
+logger = logging.getLogger(__name__)
+
 if Config.ENVIRONMENT == "QA":
     SQLALCHEMY_DATABASE_URL = Config.QA_DATABASE_URL
 else:
     SQLALCHEMY_DATABASE_URL = Config.DATABASE_URL
 
+ASYNC_SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace(
+    "postgresql://", "postgresql+asyncpg://", 1
+)
+
 DB_NAME = SQLALCHEMY_DATABASE_URL.split("/")[-1]
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+READ_DATABASE_URLS = [
+    url.strip().replace("postgresql://", "postgresql+asyncpg://", 1)
+    for url in Config.READ_DATABASE_URL.split(",")
+    if url.strip()
+]
+
+# The lag is zero on a primary, and on a replica that has replayed all it
+# received; the LSN is the last WAL position whose changes it can serve.
+REPLICA_STATE_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery()"
+    " OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END,"
+    " CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn()"
+    " ELSE pg_current_wal_lsn() END::text"
+)
+WRITE_LSN_QUERY = text("SELECT pg_current_wal_lsn()::text")
+
+# Carries the primary's WAL position after a user's write back to the client,
+# so the user's next reads on any worker avoid replicas behind it.
+WRITE_LSN_HEADER = "X-Last-Write-LSN"
+WRITE_LSN_COOKIE = "last_write_lsn"
+
 Base = declarative_base()
 
+async_engine: Optional[AsyncEngine] = None
+read_engines: list = []
+healthy_read_engines: list = []
+read_engine_turns = itertools.count()
+# replica engine -> WAL position it had replayed at the last check
+replayed_lsns = {}
+
+pool_stats = {
+    "checkouts": 0,
+    "timeouts": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+
+
+class MonitoredQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a connection."""
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_stats["timeouts"] += 1
+            raise
+
+        wait = time.perf_counter() - started_at
+        pool_stats["checkouts"] += 1
+        pool_stats["wait_seconds_total"] += wait
+        pool_stats["wait_seconds_max"] = max(pool_stats["wait_seconds_max"], wait)
+
+        return connection
+
+
+def get_engine_options() -> dict:
+    options = {
+        "poolclass": MonitoredQueuePool,
+        "pool_size": Config.DB_POOL_SIZE,
+        "max_overflow": Config.DB_MAX_OVERFLOW,
+        "pool_timeout": Config.DB_POOL_TIMEOUT,
+        "pool_pre_ping": Config.DB_POOL_PRE_PING,
+        "pool_recycle": Config.DB_POOL_RECYCLE,
+    }
+    if Config.DB_PGBOUNCER:
+        # PgBouncer hands each transaction to any server connection, where
+        # statements prepared and cached on another one do not exist.
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+        }
+
+    return options
+
+
+def get_async_engine() -> AsyncEngine:
+    """Create the engine on first use; creating it opens no connection."""
+    global async_engine
+    if async_engine is None:
+        async_engine = create_async_engine(
+            ASYNC_SQLALCHEMY_DATABASE_URL, **get_engine_options()
+        )
+
+    return async_engine
+
+
+def get_read_engines() -> list:
+    """Create the replica engines on first use, all of them healthy."""
+    if not read_engines and READ_DATABASE_URLS:
+        read_engines.extend(
+            create_async_engine(url, **get_engine_options())
+            for url in READ_DATABASE_URLS
+        )
+        healthy_read_engines[:] = read_engines
+
+    return read_engines
+
+
+def get_read_engine(min_lsn: int = 0) -> AsyncEngine:
+    """Take the healthy replicas that replayed min_lsn in turn, else the primary."""
+    get_read_engines()
+    engines = healthy_read_engines
+    if min_lsn:
+        engines = [
+            engine for engine in engines if replayed_lsns.get(engine, 0) >= min_lsn
+        ]
+    if not engines:
+        return get_async_engine()
+
+    return engines[next(read_engine_turns) % len(engines)]
+
+
+def parse_lsn(lsn: Optional[str]) -> int:
+    """Turn a 'hi/lo' hexadecimal WAL position into an int, 0 when invalid."""
+    high, _, low = (lsn or "").partition("/")
+    try:
+        return (int(high, 16) << 32) + int(low, 16)
+    except ValueError:
+        return 0
+
+
+async def get_replica_state(engine: AsyncEngine) -> tuple:
+    async with engine.connect() as connection:
+        lag, lsn = (await connection.execute(REPLICA_STATE_QUERY)).one()
+
+    return float(lag), parse_lsn(lsn)
 
-def create_database():
+
+async def check_read_engines():
+    """Keep the replicas that answer and lag at most READ_REPLICA_MAX_LAG."""
+    healthy = []
+    for index, engine in enumerate(get_read_engines()):
+        try:
+            lag, lsn = await asyncio.wait_for(
+                get_replica_state(engine), Config.READ_REPLICA_CHECK_INTERVAL
+            )
+        except (OSError, asyncio.TimeoutError, exc.SQLAlchemyError) as error:
+            logger.warning("Read replica %d is unreachable: %s", index, error)
+            continue
+
+        if lag > Config.READ_REPLICA_MAX_LAG:
+            logger.warning("Read replica %d lags %.1f s behind", index, lag)
+            continue
+        replayed_lsns[engine] = lsn
+        healthy.append(engine)
+
+    healthy_read_engines[:] = healthy
+
+
+async def monitor_read_engines():
+    while True:
+        await check_read_engines()
+        await asyncio.sleep(Config.READ_REPLICA_CHECK_INTERVAL)
+
+
+async def get_write_lsn(db: AsyncSession) -> Optional[str]:
+    """The primary's WAL position, covering every write committed so far.
+
+    Only read when there are replicas to route around.
+    """
+    if not READ_DATABASE_URLS:
+        return None
+
+    return await db.scalar(WRITE_LSN_QUERY)
+
+
+def get_pool_status() -> dict:
+    pool = get_async_engine().pool
+
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": Config.DB_MAX_OVERFLOW,
+        "timeout_seconds": pool.timeout(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "pgbouncer": Config.DB_PGBOUNCER,
+        "read_replicas": len(read_engines),
+        "healthy_read_replicas": len(healthy_read_engines),
+        **pool_stats,
+    }
+
+
+async def dispose_async_engine():
+    global async_engine
+    if async_engine is not None:
+        await async_engine.dispose()
+        async_engine = None
+    for engine in read_engines:
+        await engine.dispose()
+    read_engines.clear()
+    healthy_read_engines.clear()
+    replayed_lsns.clear()
+
+
+class LazyAsyncSessionMaker(async_sessionmaker):
+    def __call__(self, **local_kw):
+        local_kw.setdefault("bind", get_async_engine())
+        return super().__call__(**local_kw)
+
+
+class ReadAsyncSessionMaker(async_sessionmaker):
+    def __call__(self, min_lsn: int = 0, **local_kw):
+        local_kw.setdefault("bind", get_read_engine(min_lsn))
+        return super().__call__(**local_kw)
+
+
+AsyncSessionLocal = LazyAsyncSessionMaker(autoflush=False, expire_on_commit=False)
+ReadSessionLocal = ReadAsyncSessionMaker(autoflush=False, expire_on_commit=False)
+
+
+def get_read_session(write_lsn: Optional[str] = None) -> AsyncSession:
+    """Open a session on a replica that has the client's last write.
+
+    write_lsn is the WAL position returned after the client's last write;
+    when no healthy replica has replayed it, the session is on the primary.
+    """
+    return ReadSessionLocal(min_lsn=parse_lsn(write_lsn))
+
+
+def is_read_replica(db: AsyncSession) -> bool:
+    return db.bind is not get_async_engine()
+
+
+def create_database_if_missing():
     conn = psycopg2.connect(
         dbname=Config.ADMIN_DB,
         user=Config.ADMIN_DB_USER,
         password=Config.ADMIN_DB_PASSWORD,
         host=Config.DB_HOST,
     )
-    conn.autocommit = True
-    cur = conn.cursor()
-    create_db_statement = sql.SQL("CREATE DATABASE {}").format(sql.Identifier(DB_NAME))
-
-    cur.execute(create_db_statement)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (DB_NAME,))
+            if cur.fetchone() is None:
+                create_db_statement = sql.SQL("CREATE DATABASE {}").format(
+                    sql.Identifier(DB_NAME)
+                )
+                cur.execute(create_db_statement)
+    finally:
+        conn.close()
 
 
-try:
-    conn = psycopg2.connect(SQLALCHEMY_DATABASE_URL)
-except psycopg2.OperationalError as e:
-    if f'database "{DB_NAME}" does not exist' in str(e):
-        create_database()
-    else:
-        raise e
+async def prepare_database():
+    """Create the database and any missing tables, for DB_CREATE_ON_STARTUP."""
+    await run_in_threadpool(create_database_if_missing)
+    async with get_async_engine().begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
@@ -1,16 +1,68 @@
+import time
+
+STARTED_AT = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+
 import uvicorn
 from fastapi import FastAPI
 
 import models
-from controlers import auth, check
-from database import engine
+from config import Config
+from controlers import admin, auth, check, health, metrics
+from database import (
+    READ_DATABASE_URLS,
+    dispose_async_engine,
+    monitor_read_engines,
+    prepare_database,
+)
+from services.check_writer_service import check_writer
+from services.receipt_job_service import shutdown_render_executor
+from utils.metrics import setup_instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    imported_in = time.perf_counter() - STARTED_AT
+    if Config.DB_CREATE_ON_STARTUP:
+        await prepare_database()
+    if Config.GROUP_COMMIT_ENABLED:
+        check_writer.start()
+    replica_monitor = None
+    if READ_DATABASE_URLS:
+        replica_monitor = asyncio.create_task(monitor_read_engines())
+    logger.info(
+        "Worker ready in %.0f ms (imports %.0f ms)",
+        (time.perf_counter() - STARTED_AT) * 1000,
+        imported_in * 1000,
+    )
+
+    yield
+
+    await check_writer.stop()
+    shutdown_render_executor()
+    if replica_monitor is not None:
+        replica_monitor.cancel()
+        with suppress(asyncio.CancelledError):
+            await replica_monitor
+    await dispose_async_engine()
 
-app = FastAPI()
 
-models.Base.metadata.create_all(bind=engine)
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(auth.router)
 app.include_router(check.router)
+if Config.METRICS_ENABLED:
+    app.include_router(metrics.router)
+if Config.READINESS_PROBE_ENABLED:
+    app.include_router(health.router)
+if Config.ADMIN_API_TOKEN:
+    app.include_router(admin.router)
+setup_instrumentation(app)
 
 
 if __name__ == "__main__":
@@ -1,3 +1,10 @@
 from database import Base
 from models.auth_model import Users
-from models.check_model import Checks, Products
+from models.check_model import (
+    Checks,
+    DailyCheckTotals,
+    IdempotencyKeys,
+    Products,
+    ReceiptJobs,
+    Receipts,
+)
@@ -14,5 +14,8 @@ class Users(Base):
     is_active = Column(Boolean, default=True)
 
     checks = relationship(
-        "Checks", back_populates="owner", cascade="all, delete-orphan"
+        "Checks",
+        back_populates="owner",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
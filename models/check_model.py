@@ -1,4 +1,14 @@
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    Numeric,
+    String,
+)
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -9,11 +19,11 @@ class Products(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     check_id = Column(
-        Integer, ForeignKey("checks.id", ondelete="CASCADE"), nullable=False
+        Integer, ForeignKey("checks.id", ondelete="CASCADE"), nullable=False, index=True
     )
     name = Column(String, nullable=False)
-    price = Column(Float, nullable=False)
-    total = Column(Float, nullable=False)
+    price = Column(Numeric(12, 2), nullable=False)
+    total = Column(Numeric(12, 2), nullable=False)
     quantity = Column(Integer, nullable=False)
 
     checks = relationship("Checks", back_populates="products")
@@ -21,6 +31,16 @@ class Products(Base):
 
 class Checks(Base):
     __tablename__ = "checks"
+    __table_args__ = (
+        Index("ix_checks_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index(
+            "ix_checks_user_id_payment_type_created_at_id",
+            "user_id",
+            "payment_type",
+            "created_at",
+            "id",
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(
@@ -28,13 +48,67 @@ class Checks(Base):
     )
     payment_type = Column(String, nullable=False)
     buyer_name = Column(String, nullable=False)
-    payment_amount = Column(Float, nullable=False)
-    total = Column(Float, nullable=False)
-    rest = Column(Float, nullable=False)
+    payment_amount = Column(Numeric(12, 2), nullable=False)
+    total = Column(Numeric(12, 2), nullable=False)
+    rest = Column(Numeric(12, 2), nullable=False)
     comment = Column(String, nullable=True)
     created_at = Column(DateTime, nullable=True)
 
     owner = relationship("Users", back_populates="checks")
     products = relationship(
-        "Products", back_populates="checks", cascade="all, delete-orphan"
+        "Products",
+        back_populates="checks",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+
+class Receipts(Base):
+    __tablename__ = "receipts"
+
+    check_id = Column(
+        Integer, ForeignKey("checks.id", ondelete="CASCADE"), primary_key=True
+    )
+    template_digest = Column(String, nullable=False)
+    html = Column(LargeBinary, nullable=False)
+    text = Column(LargeBinary, nullable=False)
+
+
+class DailyCheckTotals(Base):
+    __tablename__ = "daily_check_totals"
+
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    day = Column(Date, primary_key=True)
+    payment_type = Column(String, primary_key=True)
+    check_count = Column(Integer, nullable=False)
+    total = Column(Numeric(14, 2), nullable=False)
+
+
+class IdempotencyKeys(Base):
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    key = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=False)
+    response = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+
+class ReceiptJobs(Base):
+    __tablename__ = "receipt_jobs"
+
+    id = Column(String, primary_key=True)
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
     )
+    status = Column(String, nullable=False)
+    receipt_format = Column(String, nullable=False)
+    total = Column(Integer, nullable=False)
+    rendered = Column(Integer, nullable=False)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+    finished_at = Column(DateTime, nullable=True)
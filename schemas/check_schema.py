@@ -1,17 +1,26 @@
 from typing import List, Optional
 
-from pydantic import BaseModel, Field, constr
+from pydantic import BaseModel, Field, condecimal, conlist, constr, validator
+
+from config import Config
+from utils.money import to_money
+
+Money = condecimal(gt=0, max_digits=12, decimal_places=2)
 
 
 class Product(BaseModel):
     name: str
-    price: float = Field(gt=0)
+    price: Money
     quantity: int = Field(gt=0)
 
+    _quantize_price = validator("price", allow_reuse=True)(to_money)
+
 
 class Payment(BaseModel):
     type: constr(regex="cash|cashless")
-    amount: float = Field(gt=0)
+    amount: Money
+
+    _quantize_amount = validator("amount", allow_reuse=True)(to_money)
 
 
 class Order(BaseModel):
@@ -19,3 +28,6 @@ class Order(BaseModel):
     payment: Payment
     buyer_name: str
     comment: Optional[str]
+
+
+OrdersBatch = conlist(Order, min_items=1, max_items=Config.CHECK_BATCH_MAX_SIZE)
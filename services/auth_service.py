@@ -1,3 +1,5 @@
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -5,11 +7,16 @@ from fastapi import Security
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import joinedload
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
 from config import Config
-from utils.exceptions import get_user_exception
+from services.receipt_service import evict_receipts
+from utils.exceptions import bad_request_exception, get_user_exception
+from utils.hash_pool import run_in_hash_pool
+from utils.metrics import metrics_registry, render_stats
 
 SECRET_KEY = Config.SECRET_KEY
 ALGORITHM = Config.ALGORITHM
@@ -17,21 +24,47 @@ ALGORITHM = Config.ALGORITHM
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="/login/")
 bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# unique index -> error detail of a sign-up that violates it
+UNIQUE_USER_FIELDS = {
+    "ix_users_email": "The email already exist",
+    "ix_users_username": "The username already exist",
+}
+# Check ids read at a time when unsubscribing, to evict their receipts
+RECEIPT_EVICTION_CHUNK_SIZE = 1000
+
+# token -> (exp timestamp, user claims), least recently used first
+token_cache = OrderedDict()
+token_cache_stats = {"hits": 0, "misses": 0}
+metrics_registry.add_collector(
+    lambda: render_stats(
+        "token_cache",
+        token_cache_stats,
+        {
+            "hits": ("counter", "Bearer tokens found verified in the cache."),
+            "misses": ("counter", "Bearer tokens verified by decoding the JWT."),
+        },
+    )
+)
 
-def get_password_hash(password):
-    return bcrypt_context.hash(password)
 
+async def get_password_hash(password):
+    return await run_in_hash_pool(bcrypt_context.hash, password)
 
-def verify_password(plain_password, hashed_password):
-    return bcrypt_context.verify(plain_password, hashed_password)
 
+async def verify_password(plain_password, hashed_password):
+    return await run_in_hash_pool(
+        bcrypt_context.verify, plain_password, hashed_password
+    )
 
-def authenticate_user(username: str, password: str, db):
-    user = db.query(models.Users).filter(models.Users.username == username).first()
+
+async def authenticate_user(username: str, password: str, db: AsyncSession):
+    user = await db.scalar(
+        select(models.Users).filter(models.Users.username == username)
+    )
 
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return False
 
     return user
@@ -50,7 +83,22 @@ def create_access_token(
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(token: str = Security(oauth2_bearer)):
+def cache_verified_token(token: str, expires_at: int, user: dict):
+    token_cache[token] = (expires_at, user)
+    if len(token_cache) > Config.TOKEN_CACHE_SIZE:
+        token_cache.popitem(last=False)
+
+
+async def get_current_user(token: str = Security(oauth2_bearer)):
+    cached = token_cache.get(token)
+    if cached is not None:
+        if cached[0] > time.time():
+            token_cache_stats["hits"] += 1
+            token_cache.move_to_end(token)
+            return dict(cached[1])
+        token_cache.pop(token, None)
+
+    token_cache_stats["misses"] += 1
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -58,28 +106,45 @@ def get_current_user(token: str = Security(oauth2_bearer)):
         if username is None or user_id is None:
             raise get_user_exception()
 
-        return {"username": username, "id": user_id}
+        user = {"username": username, "id": user_id}
+        if isinstance(payload.get("exp"), int):
+            cache_verified_token(token, payload["exp"], user)
+
+        return dict(user)
     except JWTError:
         raise get_user_exception()
 
 
-async def create_user(user_data, db) -> int:
+async def create_user(user_data, db: AsyncSession) -> int:
     create_user_model = models.Users()
     create_user_model.email = user_data.email
     create_user_model.username = user_data.username
-    create_user_model.hashed_password = get_password_hash(user_data.password)
+    create_user_model.hashed_password = await get_password_hash(user_data.password)
     create_user_model.is_active = True
 
     db.add(create_user_model)
-    db.commit()
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        for index, detail in UNIQUE_USER_FIELDS.items():
+            if index in str(e.orig):
+                raise bad_request_exception(detail=detail)
+        raise e
 
     return create_user_model.id
 
 
-async def delete_user(user_id: int, db):
-    user_to_delete = (
-        db.query(models.Users).options(joinedload(models.Users.checks)).get(user_id)
+async def delete_user(user_id: int, db: AsyncSession):
+    # Cached receipts are keyed by check id, so the ids are streamed from a
+    # server-side cursor in bounded chunks to evict them.
+    check_ids = await db.stream_scalars(
+        select(models.Checks.id)
+        .filter(models.Checks.user_id == user_id)
+        .execution_options(yield_per=RECEIPT_EVICTION_CHUNK_SIZE)
     )
-
-    db.delete(user_to_delete)
-    db.commit()
+    async for chunk in check_ids.partitions():
+        await evict_receipts(chunk)
+    # checks, products and receipts go with the user via ON DELETE CASCADE
+    await db.execute(delete(models.Users).filter(models.Users.id == user_id))
+    await db.commit()
@@ -1,29 +1,78 @@
+import base64
+import binascii
 import datetime
 import hashlib
 import hmac
+import json
+import time
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from typing import Optional
 
-from sqlalchemy import asc
+from sqlalchemy import asc, func, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
 import models
 from config import Config
+from services.idempotency_service import save_idempotent_response
+from services.rollup_service import add_daily_check_totals
 from utils.exceptions import bad_request_exception
+from utils.money import ZERO, get_order_totals
+from utils.responses import FastJSONResponse
 
+PAYMENT_TOO_LOW_DETAIL = "Payment amount cannot be less than total product's cost"
+# checks.id is a PostgreSQL integer.
+MIN_CHECK_ID, MAX_CHECK_ID = -(2**31), 2**31 - 1
 
+CHECK_COLUMNS = (
+    models.Checks.id,
+    models.Checks.payment_type,
+    models.Checks.payment_amount,
+    models.Checks.total,
+    models.Checks.rest,
+    models.Checks.comment,
+    models.Checks.buyer_name,
+    models.Checks.created_at,
+)
+PRODUCT_COLUMNS = (
+    models.Products.check_id,
+    models.Products.id,
+    models.Products.name,
+    models.Products.price,
+    models.Products.quantity,
+    models.Products.total,
+)
+
+# user_id -> {filters key: (expires_at, count)}, least recently used user first
+check_count_cache = OrderedDict()
+CHECK_COUNT_KEYS_PER_USER = 32
+
+# Keyed with the secret once; each signature only hashes the check id.
+signature_hmac = hmac.new(Config.SECRET_KEY.encode(), digestmod=hashlib.sha256)
+
+
+@lru_cache(maxsize=Config.SIGNATURE_CACHE_SIZE)
 def generate_signature(check_id) -> str:
-    return hmac.new(
-        Config.SECRET_KEY.encode(), str(check_id).encode(), hashlib.sha256
-    ).hexdigest()
+    signature = signature_hmac.copy()
+    signature.update(str(check_id).encode())
+
+    return signature.hexdigest()
+
+
+def get_check_url_prefix(url_obj) -> str:
+    return f"http://{url_obj.hostname}:{url_obj.port}/checks/"
 
 
 def generate_check_url(url_obj, check_id: int) -> str:
     signature = generate_signature(check_id=check_id)
-    url = f"http://{url_obj.hostname}:{url_obj.port}/checks/{check_id}/{signature}/"
+    url = f"{get_check_url_prefix(url_obj)}{check_id}/{signature}/"
 
     return url
 
 
-def serialize_check(url_obj, check: models.Checks) -> dict:
+def serialize_check(url_prefix: str, check, products: list) -> dict:
     return {
         "check_id": check.id,
         "payment_type": check.payment_type,
@@ -33,55 +82,194 @@ def serialize_check(url_obj, check: models.Checks) -> dict:
         "comment": check.comment,
         "buyer_name": check.buyer_name,
         "created_at": check.created_at,
-        "url": generate_check_url(url_obj=url_obj, check_id=check.id),
-        "products": [
-            {
-                "product_id": product.id,
-                "name": product.name,
-                "price": product.price,
-                "quantity": product.quantity,
-                "total": product.total,
-            }
-            for product in check.products
-        ],
+        "url": f"{url_prefix}{check.id}/{generate_signature(check.id)}/",
+        "products": products,
     }
 
 
-async def get_filtered_checks(filters: dict, user_id: int, url, db) -> dict:
-    user = db.query(models.Users).filter(models.Users.id == user_id).first()
-    query = (
-        db.query(models.Checks)
-        .filter(models.Checks.owner == user)
-        .options(joinedload(models.Checks.products))
+async def get_checks_products(check_ids: list, db: AsyncSession) -> dict:
+    products = {check_id: [] for check_id in check_ids}
+    if not check_ids:
+        return products
+
+    rows = await db.execute(
+        select(*PRODUCT_COLUMNS)
+        .filter(models.Products.check_id.in_(check_ids))
+        .order_by(models.Products.id)
     )
+    for check_id, product_id, name, price, quantity, total in rows:
+        products[check_id].append(
+            {
+                "product_id": product_id,
+                "name": name,
+                "price": price,
+                "quantity": quantity,
+                "total": total,
+            }
+        )
+
+    return products
+
+
+def encode_check_cursor(check: models.Checks) -> str:
+    payload = json.dumps([check.created_at.isoformat(), check.id])
+
+    return base64.urlsafe_b64encode(payload.encode()).decode()
 
+
+def decode_check_cursor(cursor: str) -> tuple:
+    try:
+        created_at, check_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = datetime.datetime.fromisoformat(created_at)
+        check_id = int(check_id)
+    except (binascii.Error, TypeError, ValueError):
+        raise bad_request_exception(detail="Invalid cursor")
+    # Checked here, as the database would reject them with a server error.
+    if created_at.tzinfo is not None or not MIN_CHECK_ID <= check_id <= MAX_CHECK_ID:
+        raise bad_request_exception(detail="Invalid cursor")
+
+    return created_at, check_id
+
+
+def parse_filter_date(value: str) -> datetime.datetime:
+    # The route only checks the DD/MM/YYYY shape, so 31/02 gets here too.
+    try:
+        return datetime.datetime.strptime(value, "%d/%m/%Y")
+    except ValueError:
+        raise bad_request_exception(detail="Invalid date")
+
+
+def get_check_conditions(filters: dict, user_id: int) -> list:
+    conditions = [models.Checks.user_id == user_id]
     if filters["total_from"]:
-        query = query.filter(models.Checks.total >= float(filters["total_from"]))
+        total_from = str(filters["total_from"]).replace(",", ".")
+        try:
+            conditions.append(models.Checks.total >= Decimal(total_from))
+        except InvalidOperation:
+            raise bad_request_exception(detail="Invalid total_from")
     if filters["payment_type"]:
-        query = query.filter(models.Checks.payment_type == filters["payment_type"])
+        conditions.append(models.Checks.payment_type == filters["payment_type"])
     if filters["date_from"]:
-        date_from = datetime.datetime.strptime(filters["date_from"], "%d/%m/%Y")
-        query = query.filter(models.Checks.created_at >= date_from)
+        date_from = parse_filter_date(filters["date_from"])
+        conditions.append(models.Checks.created_at >= date_from)
+    if filters["date_to"]:
+        date_to = parse_filter_date(filters["date_to"])
+        # Inclusive, so the range ends at the start of the next day
+        conditions.append(
+            models.Checks.created_at < date_to + datetime.timedelta(days=1)
+        )
+
+    return conditions
+
+
+def invalidate_check_count(user_id: int):
+    check_count_cache.pop(user_id, None)
+
 
-    query = query.order_by(asc(models.Checks.created_at))
-    query = query.offset(filters["per_page"] * (filters["page"] - 1)).limit(
-        filters["per_page"] * filters["page"]
+async def count_checks(filters: dict, user_id: int, db: AsyncSession) -> int:
+    key = (
+        filters["total_from"],
+        filters["payment_type"],
+        filters["date_from"],
+        filters["date_to"],
     )
+    user_counts = check_count_cache.get(user_id, {})
+    cached = user_counts.get(key)
+    if cached and cached[0] > time.monotonic():
+        check_count_cache.move_to_end(user_id)
+        return cached[1]
+
+    total_count = await db.scalar(
+        select(func.count())
+        .select_from(models.Checks)
+        .filter(*get_check_conditions(filters, user_id))
+    )
+
+    now = time.monotonic()
+    # Drop expired filter combinations and keep the newest few, so a client
+    # cycling through filters does not grow the user's entry without limit.
+    user_counts = {
+        cached_key: cached
+        for cached_key, cached in user_counts.items()
+        if cached[0] > now
+    }
+    while len(user_counts) >= CHECK_COUNT_KEYS_PER_USER:
+        del user_counts[next(iter(user_counts))]
+    user_counts[key] = (now + Config.CHECK_COUNT_CACHE_TTL, total_count)
+    check_count_cache[user_id] = user_counts
+    check_count_cache.move_to_end(user_id)
+    if len(check_count_cache) > Config.CHECK_COUNT_CACHE_SIZE:
+        check_count_cache.popitem(last=False)
+
+    return total_count
+
+
+async def get_filtered_checks(
+    filters: dict, user_id: int, url, db: AsyncSession
+) -> dict:
+    query = select(*CHECK_COLUMNS).filter(*get_check_conditions(filters, user_id))
+    query = query.order_by(asc(models.Checks.created_at), asc(models.Checks.id))
+    if filters["cursor"]:
+        created_at, check_id = decode_check_cursor(filters["cursor"])
+        query = query.filter(
+            tuple_(models.Checks.created_at, models.Checks.id)
+            > tuple_(created_at, check_id)
+        )
+    else:
+        query = query.offset(filters["per_page"] * (filters["page"] - 1))
+
+    # One extra row tells whether there is a next page without a second query.
+    checks = await db.execute(query.limit(filters["per_page"] + 1))
+    checks = checks.all()
+
+    next_cursor = None
+    if len(checks) > filters["per_page"]:
+        checks = checks[: filters["per_page"]]
+        next_cursor = encode_check_cursor(checks[-1])
+
+    total_count = None
+    if filters["include_count"]:
+        total_count = await count_checks(filters=filters, user_id=user_id, db=db)
+
+    # Products are fetched separately: joining them would repeat every check
+    # column once per product row.
+    products = await get_checks_products([check.id for check in checks], db=db)
+    url_prefix = get_check_url_prefix(url)
 
     response_data = {
-        "total_count": query.count(),
-        "checks": [serialize_check(url, check) for check in query.all()],
+        "total_count": total_count,
+        "next_cursor": next_cursor,
+        "checks": [
+            serialize_check(url_prefix, check, products[check.id]) for check in checks
+        ],
     }
 
     return response_data
 
 
-async def add_check_to_db(order, user_id: int, db) -> dict:
-    total = sum([product.price * product.quantity for product in order.products])
+def serialize_created_check(
+    check_id: int, order, line_totals: list, total, created_at: datetime.datetime
+) -> dict:
+    return {
+        "id": check_id,
+        "products": [
+            {**product.__dict__, "total": total_price}
+            for product, total_price in zip(order.products, line_totals)
+        ],
+        "payment": {"amount": order.payment.amount, "type": order.payment.type},
+        "total": total,
+        "rest": order.payment.amount - total,
+        "created_at": created_at,
+        "buyer_name": order.buyer_name,
+    }
+
+
+async def add_check_to_db(
+    order, user_id: int, db: AsyncSession, idempotency_key: Optional[str] = None
+) -> dict:
+    line_totals, total = get_order_totals(order.products)
     if total > order.payment.amount:
-        raise bad_request_exception(
-            detail="Payment amount cannot be less than total product's cost"
-        )
+        raise bad_request_exception(detail=PAYMENT_TOO_LOW_DETAIL)
 
     check_model = models.Checks()
     check_model.created_at = datetime.datetime.utcnow()
@@ -93,44 +281,159 @@ async def add_check_to_db(order, user_id: int, db) -> dict:
     check_model.total = total
     check_model.buyer_name = order.buyer_name
     db.add(check_model)
-    db.flush()
-
-    product_models, products = [], []
-    for product in order.products:
-        total_price = product.price * product.quantity
-        products.append({**product.__dict__, "total": total_price})
-        product_models.append(
-            models.Products(
-                name=product.name,
-                check_id=check_model.id,
-                price=product.price,
-                quantity=product.quantity,
-                total=total_price,
-            )
+    await db.flush()
+
+    db.add_all(
+        models.Products(
+            name=product.name,
+            check_id=check_model.id,
+            price=product.price,
+            quantity=product.quantity,
+            total=total_price,
+        )
+        for product, total_price in zip(order.products, line_totals)
+    )
+    await add_daily_check_totals(
+        user_id=user_id,
+        day=check_model.created_at.date(),
+        totals={check_model.payment_type: (1, total)},
+        db=db,
+    )
+
+    response = serialize_created_check(
+        check_model.id, order, line_totals, total, check_model.created_at
+    )
+    if idempotency_key is not None:
+        # Saved in the same transaction, so a replay never misses a check.
+        await save_idempotent_response(
+            user_id=user_id,
+            key=idempotency_key,
+            response=FastJSONResponse(content=response).body,
+            db=db,
+        )
+    await db.commit()
+    invalidate_check_count(user_id)
+
+    return response
+
+
+def get_payment_type_totals(check_rows: list) -> dict:
+    totals = {}
+    for row in check_rows:
+        check_count, total = totals.get(row["payment_type"], (0, ZERO))
+        totals[row["payment_type"]] = (check_count + 1, total + row["total"])
+
+    return totals
+
+
+async def reserve_check_ids(count: int, db: AsyncSession) -> list:
+    """Take count ids from the checks sequence.
+
+    Ids are reserved up front so products can reference their checks
+    without mapping RETURNING rows back to orders.
+    """
+    check_ids = await db.scalars(
+        select(func.nextval(func.pg_get_serial_sequence("checks", "id"))).select_from(
+            func.generate_series(1, count)
         )
+    )
+
+    return list(check_ids)
+
+
+def build_check_rows(
+    check_id: int,
+    user_id: int,
+    order,
+    line_totals: list,
+    total,
+    created_at: datetime.datetime,
+) -> tuple:
+    """Return the checks row and the products rows of an order."""
+    check_row = {
+        "id": check_id,
+        "user_id": user_id,
+        "payment_type": order.payment.type,
+        "buyer_name": order.buyer_name,
+        "payment_amount": order.payment.amount,
+        "total": total,
+        "rest": order.payment.amount - total,
+        "comment": order.comment,
+        "created_at": created_at,
+    }
+    product_rows = [
+        {
+            "check_id": check_id,
+            "name": product.name,
+            "price": product.price,
+            "quantity": product.quantity,
+            "total": total_price,
+        }
+        for product, total_price in zip(order.products, line_totals)
+    ]
+
+    return check_row, product_rows
 
-    db.bulk_save_objects(product_models)
-    db.commit()
 
+async def add_checks_batch_to_db(orders: list, user_id: int, db: AsyncSession) -> dict:
+    created_at = datetime.datetime.utcnow()
+    results, valid_orders = [], []
+    for index, order in enumerate(orders):
+        line_totals, total = get_order_totals(order.products)
+        if total > order.payment.amount:
+            results.append({"index": index, "detail": PAYMENT_TOO_LOW_DETAIL})
+        else:
+            valid_orders.append((index, order, line_totals, total))
+
+    if valid_orders:
+        check_ids = await reserve_check_ids(len(valid_orders), db)
+
+        check_rows, product_rows = [], []
+        for check_id, (index, order, line_totals, total) in zip(
+            check_ids, valid_orders
+        ):
+            check_row, check_product_rows = build_check_rows(
+                check_id, user_id, order, line_totals, total, created_at
+            )
+            check_rows.append(check_row)
+            product_rows.extend(check_product_rows)
+            results.append(
+                {
+                    "index": index,
+                    "id": check_id,
+                    "total": total,
+                    "rest": order.payment.amount - total,
+                    "created_at": created_at,
+                }
+            )
+
+        await db.execute(insert(models.Checks), check_rows)
+        if product_rows:
+            await db.execute(insert(models.Products), product_rows)
+        await add_daily_check_totals(
+            user_id=user_id,
+            day=created_at.date(),
+            totals=get_payment_type_totals(check_rows),
+            db=db,
+        )
+        await db.commit()
+        invalidate_check_count(user_id)
+
+    results.sort(key=lambda result: result["index"])
     response = {
-        "id": check_model.id,
-        "products": products,
-        "payment": {
-            "amount": check_model.payment_amount,
-            "type": check_model.payment_type,
-        },
-        "total": check_model.total,
-        "rest": check_model.rest,
-        "created_at": check_model.created_at,
-        "buyer_name": check_model.buyer_name,
+        "created": len(valid_orders),
+        "failed": len(orders) - len(valid_orders),
+        "results": results,
     }
 
     return response
 
 
-async def get_check_by_id(check_id: str, db):
-    return (
-        db.query(models.Checks)
-        .filter(models.Checks.id == check_id)
+async def get_check_by_id(check_id: str, db: AsyncSession):
+    checks = await db.scalars(
+        select(models.Checks)
+        .filter(models.Checks.id == int(check_id))
         .options(joinedload(models.Checks.products))
-    ).first()
+    )
+
+    return checks.unique().first()
@@ -0,0 +1,177 @@
+import asyncio
+import datetime
+from collections import defaultdict
+from contextlib import suppress
+from typing import NamedTuple, Optional
+
+from sqlalchemy import insert
+
+import models
+from config import Config
+from database import AsyncSessionLocal
+from services.check_service import (
+    PAYMENT_TOO_LOW_DETAIL,
+    build_check_rows,
+    get_payment_type_totals,
+    invalidate_check_count,
+    reserve_check_ids,
+    serialize_created_check,
+)
+from services.rollup_service import add_daily_check_totals
+from utils.exceptions import bad_request_exception, service_unavailable_exception
+from utils.money import get_order_totals
+
+QUEUE_FULL_DETAIL = "Too many checks are waiting to be written"
+
+
+class PendingCheck(NamedTuple):
+    order: object
+    user_id: int
+    line_totals: list
+    total: object
+    future: asyncio.Future
+
+
+async def commit_checks(batch: list) -> list:
+    """Insert the checks of a batch in one transaction and return responses."""
+    created_at = datetime.datetime.utcnow()
+    check_rows, product_rows, responses = [], [], []
+    user_check_rows = defaultdict(list)
+    async with AsyncSessionLocal() as db:
+        check_ids = await reserve_check_ids(len(batch), db)
+        for check_id, pending in zip(check_ids, batch):
+            check_row, check_product_rows = build_check_rows(
+                check_id,
+                pending.user_id,
+                pending.order,
+                pending.line_totals,
+                pending.total,
+                created_at,
+            )
+            check_rows.append(check_row)
+            product_rows.extend(check_product_rows)
+            user_check_rows[pending.user_id].append(check_row)
+            responses.append(
+                serialize_created_check(
+                    check_id,
+                    pending.order,
+                    pending.line_totals,
+                    pending.total,
+                    created_at,
+                )
+            )
+
+        await db.execute(insert(models.Checks), check_rows)
+        if product_rows:
+            await db.execute(insert(models.Products), product_rows)
+        # Users in id order, like payment types, to avoid rollup deadlocks.
+        for user_id in sorted(user_check_rows):
+            await add_daily_check_totals(
+                user_id=user_id,
+                day=created_at.date(),
+                totals=get_payment_type_totals(user_check_rows[user_id]),
+                db=db,
+            )
+        await db.commit()
+
+    for user_id in user_check_rows:
+        invalidate_check_count(user_id)
+
+    return responses
+
+
+class GroupCommitWriter:
+    """Write the checks of concurrent requests in shared transactions.
+
+    Requests queue their validated orders and wait on a future. One task
+    takes whatever is queued, up to GROUP_COMMIT_MAX_BATCH checks, waits
+    at most GROUP_COMMIT_WINDOW_MS for more, and commits them together, so
+    a burst of requests costs one WAL flush instead of one each.
+    """
+
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=Config.GROUP_COMMIT_QUEUE_SIZE)
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop taking checks and wait until the queued ones are committed."""
+        if self.task is None:
+            return
+
+        task, self.task = self.task, None
+        await self.queue.join()
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    async def add_check(self, order, user_id: int) -> dict:
+        line_totals, total = get_order_totals(order.products)
+        if total > order.payment.amount:
+            raise bad_request_exception(detail=PAYMENT_TOO_LOW_DETAIL)
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait(
+                PendingCheck(order, user_id, line_totals, total, future)
+            )
+        except asyncio.QueueFull:
+            raise service_unavailable_exception(detail=QUEUE_FULL_DETAIL)
+
+        return await future
+
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            try:
+                await self.collect(batch)
+                await self.write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def collect(self, batch: list):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + Config.GROUP_COMMIT_WINDOW_MS / 1000
+        while len(batch) < Config.GROUP_COMMIT_MAX_BATCH:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def write(self, batch: list):
+        try:
+            responses = await commit_checks(batch)
+        except Exception as error:
+            if len(batch) == 1:
+                if not batch[0].future.done():
+                    batch[0].future.set_exception(error)
+                return
+
+            # One failing check, e.g. of a user deleted meanwhile, must not
+            # fail the rest of the batch.
+            for pending in batch:
+                await self.write([pending])
+            return
+
+        for pending, response in zip(batch, responses):
+            # Done already if the client went away; its check stays written.
+            if not pending.future.done():
+                pending.future.set_result(response)
+
+
+check_writer = GroupCommitWriter()
@@ -0,0 +1,137 @@
+import csv
+import io
+from typing import Optional
+
+import orjson
+from sqlalchemy import select
+
+import models
+from config import Config
+from database import get_read_session
+from services.check_service import (
+    CHECK_COLUMNS,
+    get_check_conditions,
+    get_check_url_prefix,
+    serialize_check,
+)
+from utils.responses import orjson_default
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_HEADER = (
+    "check_id",
+    "created_at",
+    "buyer_name",
+    "payment_type",
+    "payment_amount",
+    "total",
+    "rest",
+    "comment",
+    "product_id",
+    "product_name",
+    "price",
+    "quantity",
+    "product_total",
+)
+
+
+def get_export_query(filters: dict, user_id: int):
+    return (
+        select(
+            *CHECK_COLUMNS,
+            models.Products.id.label("product_id"),
+            models.Products.name.label("product_name"),
+            models.Products.price,
+            models.Products.quantity,
+            models.Products.total.label("product_total"),
+        )
+        .outerjoin(models.Products, models.Products.check_id == models.Checks.id)
+        .filter(*get_check_conditions(filters, user_id))
+        .order_by(models.Checks.created_at, models.Checks.id, models.Products.id)
+    )
+
+
+async def format_ndjson(partitions, url_prefix: str):
+    check, products = None, []
+    async for rows in partitions:
+        lines = []
+        for row in rows:
+            if check is not None and row.id != check.id:
+                lines.append(
+                    orjson.dumps(
+                        serialize_check(url_prefix, check, products),
+                        default=orjson_default,
+                    )
+                )
+                products = []
+            check = row
+            if row.product_id is not None:
+                products.append(
+                    {
+                        "product_id": row.product_id,
+                        "name": row.product_name,
+                        "price": row.price,
+                        "quantity": row.quantity,
+                        "total": row.product_total,
+                    }
+                )
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+    if check is not None:
+        line = orjson.dumps(
+            serialize_check(url_prefix, check, products), default=orjson_default
+        )
+        yield line + b"\n"
+
+
+async def format_csv(partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    async for rows in partitions:
+        for row in rows:
+            writer.writerow(
+                (
+                    row.id,
+                    row.created_at.isoformat() if row.created_at else "",
+                    row.buyer_name,
+                    row.payment_type,
+                    row.payment_amount,
+                    row.total,
+                    row.rest,
+                    row.comment,
+                    row.product_id,
+                    row.product_name,
+                    row.price,
+                    row.quantity,
+                    row.product_total,
+                )
+            )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def stream_checks_export(
+    query, url, export_format: str, write_lsn: Optional[str] = None
+):
+    """Stream the rows of an export query as NDJSON or CSV.
+
+    Rows come from a server-side cursor in CHECK_EXPORT_CHUNK_SIZE batches,
+    so memory stays flat whatever the number of checks. The session is
+    opened here because the body is sent after the route has returned; the
+    query is built by the route, so invalid filters fail before that.
+    """
+    query = query.execution_options(yield_per=Config.CHECK_EXPORT_CHUNK_SIZE)
+    async with get_read_session(write_lsn) as db:
+        result = await db.stream(query)
+        if export_format == "csv":
+            chunks = format_csv(result.partitions())
+        else:
+            chunks = format_ndjson(result.partitions(), get_check_url_prefix(url))
+
+        async for chunk in chunks:
+            yield chunk
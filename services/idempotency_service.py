@@ -0,0 +1,118 @@
+import datetime
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from config import Config
+from utils.exceptions import conflict_exception, unprocessable_entity_exception
+
+KEY_REUSED_DETAIL = "Idempotency-Key was already used for a different request"
+KEY_IN_PROGRESS_DETAIL = "A request with this Idempotency-Key is still in progress"
+
+# (user_id, key) -> (expires_at, request_hash, response), least recently used first
+idempotency_cache = OrderedDict()
+
+
+def get_request_hash(order) -> str:
+    return hashlib.sha256(order.json(sort_keys=True).encode()).hexdigest()
+
+
+def cache_response(user_id: int, key: str, request_hash: str, response: bytes):
+    expires_at = time.monotonic() + Config.IDEMPOTENCY_KEY_TTL
+    idempotency_cache[(user_id, key)] = (expires_at, request_hash, response)
+    idempotency_cache.move_to_end((user_id, key))
+    while len(idempotency_cache) > Config.IDEMPOTENCY_CACHE_SIZE:
+        idempotency_cache.popitem(last=False)
+
+
+def check_request_hash(stored_hash: str, request_hash: str):
+    if stored_hash != request_hash:
+        raise unprocessable_entity_exception(detail=KEY_REUSED_DETAIL)
+
+
+async def reserve_idempotency_key(
+    user_id: int, key: str, request_hash: str, db: AsyncSession
+) -> Optional[bytes]:
+    """Claim the key for this request or return the response stored for it.
+
+    The claim is a row inserted in the request's transaction. A concurrent
+    request with the same key blocks on that row until the first one
+    commits, then gets its stored response, or claims the key itself if the
+    first one failed and rolled back. Returns None when the key was claimed.
+    """
+    cached = idempotency_cache.get((user_id, key))
+    if cached is not None and cached[0] > time.monotonic():
+        idempotency_cache.move_to_end((user_id, key))
+        check_request_hash(cached[1], request_hash)
+        return cached[2]
+
+    now = datetime.datetime.utcnow()
+    expired_before = now - datetime.timedelta(seconds=Config.IDEMPOTENCY_KEY_TTL)
+    query = insert(models.IdempotencyKeys).values(
+        user_id=user_id, key=key, request_hash=request_hash, created_at=now
+    )
+    claimed = await db.scalar(
+        query.on_conflict_do_update(
+            index_elements=["user_id", "key"],
+            set_={
+                "request_hash": query.excluded.request_hash,
+                "response": None,
+                "created_at": query.excluded.created_at,
+            },
+            where=models.IdempotencyKeys.created_at < expired_before,
+        ).returning(models.IdempotencyKeys.key)
+    )
+    if claimed is not None:
+        return None
+
+    stored = (
+        await db.execute(
+            select(
+                models.IdempotencyKeys.request_hash, models.IdempotencyKeys.response
+            ).filter(
+                models.IdempotencyKeys.user_id == user_id,
+                models.IdempotencyKeys.key == key,
+            )
+        )
+    ).one()
+    await db.rollback()
+    check_request_hash(stored.request_hash, request_hash)
+    if stored.response is None:
+        raise conflict_exception(detail=KEY_IN_PROGRESS_DETAIL)
+
+    cache_response(user_id, key, stored.request_hash, stored.response)
+    return stored.response
+
+
+async def save_idempotent_response(
+    user_id: int, key: str, response: bytes, db: AsyncSession
+):
+    """Store the response on the claimed key, in the transaction that made it."""
+    await db.execute(
+        update(models.IdempotencyKeys)
+        .filter(
+            models.IdempotencyKeys.user_id == user_id,
+            models.IdempotencyKeys.key == key,
+        )
+        .values(response=response)
+    )
+
+
+async def purge_idempotency_keys(db: AsyncSession) -> int:
+    expired_before = datetime.datetime.utcnow() - datetime.timedelta(
+        seconds=Config.IDEMPOTENCY_KEY_TTL
+    )
+    result = await db.execute(
+        delete(models.IdempotencyKeys).filter(
+            models.IdempotencyKeys.created_at < expired_before
+        )
+    )
+    await db.commit()
+
+    return result.rowcount
@@ -0,0 +1,249 @@
+import asyncio
+import datetime
+import multiprocessing
+import os
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from types import SimpleNamespace
+from typing import Optional
+
+from sqlalchemy import asc, delete, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+import models
+from config import Config
+from database import AsyncSessionLocal
+from services.check_service import (
+    CHECK_COLUMNS,
+    get_check_conditions,
+    get_checks_products,
+)
+from services.receipt_service import RECEIPT_RENDERERS
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+RECEIPT_FILE_EXTENSIONS = {"html": "html", "txt": "txt", "escpos": "bin"}
+
+render_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_render_workers() -> int:
+    return Config.RECEIPT_RENDER_WORKERS or os.cpu_count() or 1
+
+
+def get_render_executor() -> ProcessPoolExecutor:
+    """Start the render processes on the first job, not at import."""
+    global render_executor
+    if render_executor is None:
+        # Spawned, not forked: a fork would copy the event loop, its threads
+        # and the open database connections into every worker.
+        render_executor = ProcessPoolExecutor(
+            max_workers=get_render_workers(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    return render_executor
+
+
+def shutdown_render_executor():
+    global render_executor
+    if render_executor is not None:
+        render_executor.shutdown(wait=False, cancel_futures=True)
+        render_executor = None
+
+
+def get_job_path(job_id: str) -> str:
+    return os.path.join(Config.RECEIPT_JOB_DIR, f"{job_id}.zip")
+
+
+def render_receipt_chunk(receipt_format: str, checks: list) -> list:
+    """Render checks to (archive name, bytes) pairs, in a render process."""
+    render = RECEIPT_RENDERERS[receipt_format]
+    extension = RECEIPT_FILE_EXTENSIONS[receipt_format]
+    files = []
+    for check in checks:
+        products = [SimpleNamespace(**product) for product in check["products"]]
+        check = SimpleNamespace(**{**check, "products": products})
+        name = f"{check.created_at:%Y-%m-%d}/check_{check.id}.{extension}"
+        files.append((name, render(check)))
+
+    return files
+
+
+def write_files(archive: zipfile.ZipFile, files: list):
+    for name, body in files:
+        archive.writestr(name, body)
+
+
+def serialize_receipt_job(job: models.ReceiptJobs, url_prefix: str) -> dict:
+    job_url = f"{url_prefix}receipts/bulk/{job.id}"
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "format": job.receipt_format,
+        "total": job.total,
+        "rendered": job.rendered,
+        "progress": round(job.rendered / job.total, 4) if job.total else 1.0,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "status_url": job_url,
+        "download_url": f"{job_url}/download" if job.status == JOB_DONE else None,
+    }
+
+
+async def purge_receipt_jobs(db: AsyncSession):
+    expired_before = datetime.datetime.utcnow() - datetime.timedelta(
+        seconds=Config.RECEIPT_JOB_TTL
+    )
+    job_ids = await db.scalars(
+        delete(models.ReceiptJobs)
+        .filter(models.ReceiptJobs.created_at < expired_before)
+        .returning(models.ReceiptJobs.id)
+    )
+    for job_id in job_ids:
+        try:
+            os.remove(get_job_path(job_id))
+        except FileNotFoundError:
+            pass
+
+
+async def create_receipt_job(
+    filters: dict, user_id: int, receipt_format: str, db: AsyncSession
+) -> models.ReceiptJobs:
+    await purge_receipt_jobs(db)
+    total = await db.scalar(
+        select(func.count())
+        .select_from(models.Checks)
+        .filter(*get_check_conditions(filters, user_id))
+    )
+    job = models.ReceiptJobs(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        status=JOB_PENDING,
+        receipt_format=receipt_format,
+        total=total,
+        rendered=0,
+        created_at=datetime.datetime.utcnow(),
+    )
+    db.add(job)
+    await db.commit()
+
+    return job
+
+
+async def get_receipt_job(
+    job_id: str, user_id: int, db: AsyncSession
+) -> Optional[models.ReceiptJobs]:
+    return await db.scalar(
+        select(models.ReceiptJobs).filter(
+            models.ReceiptJobs.id == job_id, models.ReceiptJobs.user_id == user_id
+        )
+    )
+
+
+async def update_receipt_job(job_id: str, db: AsyncSession, **values):
+    await db.execute(
+        update(models.ReceiptJobs)
+        .filter(models.ReceiptJobs.id == job_id)
+        .values(**values)
+    )
+    await db.commit()
+
+
+async def get_job_checks(
+    filters: dict, user_id: int, after: Optional[tuple], db: AsyncSession
+) -> list:
+    query = (
+        select(*CHECK_COLUMNS)
+        .filter(*get_check_conditions(filters, user_id))
+        .order_by(asc(models.Checks.created_at), asc(models.Checks.id))
+        .limit(Config.RECEIPT_JOB_CHUNK_SIZE)
+    )
+    if after is not None:
+        query = query.filter(tuple_(models.Checks.created_at, models.Checks.id) > after)
+
+    checks = (await db.execute(query)).all()
+    products = await get_checks_products([check.id for check in checks], db)
+
+    return [{**check._asdict(), "products": products[check.id]} for check in checks]
+
+
+async def run_receipt_job(
+    job_id: str, filters: dict, user_id: int, receipt_format: str
+):
+    """Render every matching check into the job's ZIP archive.
+
+    Runs as a background task. Chunks of checks are read in pages by
+    (created_at, id) and rendered in the process pool, at most two chunks
+    per process in flight, and the archive is written in a thread, so the
+    event loop only waits on I/O. Progress is saved after every chunk.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_render_executor()
+    max_in_flight = get_render_workers() * 2
+    path = get_job_path(job_id)
+    partial_path = f"{path}.part"
+
+    archive, pending, rendered, after, exhausted = None, set(), 0, None, False
+    async with AsyncSessionLocal() as db:
+        await update_receipt_job(job_id, db, status=JOB_RUNNING)
+        try:
+            os.makedirs(Config.RECEIPT_JOB_DIR, exist_ok=True)
+            archive = zipfile.ZipFile(partial_path, "w", zipfile.ZIP_DEFLATED)
+            while not exhausted or pending:
+                if not exhausted and len(pending) < max_in_flight:
+                    checks = await get_job_checks(filters, user_id, after, db)
+                    exhausted = len(checks) < Config.RECEIPT_JOB_CHUNK_SIZE
+                    if checks:
+                        after = (checks[-1]["created_at"], checks[-1]["id"])
+                        pending.add(
+                            loop.run_in_executor(
+                                executor, render_receipt_chunk, receipt_format, checks
+                            )
+                        )
+                    continue
+
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    files = future.result()
+                    await run_in_threadpool(write_files, archive, files)
+                    rendered += len(files)
+                await update_receipt_job(job_id, db, rendered=rendered)
+
+            await run_in_threadpool(archive.close)
+            os.replace(partial_path, path)
+        except Exception as error:
+            for future in pending:
+                future.cancel()
+            if archive is not None:
+                with suppress(OSError, ValueError):
+                    archive.close()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            await db.rollback()
+            await update_receipt_job(
+                job_id,
+                db,
+                status=JOB_FAILED,
+                error=str(error)[:500],
+                finished_at=datetime.datetime.utcnow(),
+            )
+            raise
+
+        await update_receipt_job(
+            job_id,
+            db,
+            status=JOB_DONE,
+            rendered=rendered,
+            finished_at=datetime.datetime.utcnow(),
+        )
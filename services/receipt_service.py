@@ -0,0 +1,220 @@
+import gzip
+import hashlib
+import importlib
+import inspect
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from starlette.concurrency import run_in_threadpool
+
+import models
+from config import Config
+from database import AsyncSessionLocal
+from services.check_service import get_check_by_id
+from utils import thermal_receipt
+from utils.thermal_receipt import render_escpos_receipt, render_text_receipt
+
+RECEIPT_TEMPLATE = "check/check.html"
+RECEIPT_MEDIA_TYPES = {
+    "html": "text/html",
+    "txt": "text/plain",
+    "escpos": "application/octet-stream",
+}
+# private: receipts carry buyer names and must not outlive their check in
+# shared caches.
+RECEIPT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+templates = Jinja2Templates(directory="templates")
+
+
+class ReceiptCache:
+    """In-process LRU of rendered receipts, bounded by size and age."""
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, body: bytes):
+        self.entries[key] = (time.monotonic() + self.ttl, body)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+
+def load_shared_backend(path: str):
+    """Build the shared backend from a 'module:attribute' path.
+
+    The attribute is called without arguments and must return an object with
+    ``async get(key) -> Optional[bytes]``, ``async set(key, value, ttl)`` and
+    ``async delete(key)``.
+    """
+    if not path:
+        return None
+
+    module_name, attribute = path.split(":")
+    return getattr(importlib.import_module(module_name), attribute)()
+
+
+receipt_cache = ReceiptCache(
+    max_size=Config.RECEIPT_CACHE_SIZE, ttl=Config.RECEIPT_CACHE_TTL
+)
+shared_receipt_backend = load_shared_backend(Config.RECEIPT_CACHE_BACKEND)
+
+
+@lru_cache(maxsize=None)
+def get_template_digest() -> str:
+    digest = hashlib.sha256()
+    source = templates.env.loader.get_source(templates.env, RECEIPT_TEMPLATE)[0]
+    digest.update(source.encode())
+    # Text receipts are laid out in code, so a change there changes the digest.
+    digest.update(inspect.getsource(thermal_receipt).encode())
+
+    return digest.hexdigest()[:12]
+
+
+def get_receipt_etag(signature: str, receipt_format: str = "html") -> str:
+    # The signature identifies the check and the check never changes, so only
+    # a template edit can change the rendered bytes.
+    etag = f"{signature[:16]}-{get_template_digest()}"
+    if receipt_format != "html":
+        etag = f"{etag}-{receipt_format}"
+
+    return f'"{etag}"'
+
+
+def get_shared_receipt_key(check_id: int, receipt_format: str) -> str:
+    shared_key = f"receipt:{check_id}:{get_template_digest()}"
+    if receipt_format != "html":
+        shared_key = f"{shared_key}:{receipt_format}"
+
+    return shared_key
+
+
+def render_receipt(check) -> bytes:
+    template = templates.get_template(RECEIPT_TEMPLATE)
+
+    return template.render({"check": check}).encode()
+
+
+RECEIPT_RENDERERS = {
+    "html": render_receipt,
+    "txt": render_text_receipt,
+    "escpos": render_escpos_receipt,
+}
+# Formats kept in the receipts table by prerender_receipts
+STORED_RECEIPT_COLUMNS = {"html": models.Receipts.html, "txt": models.Receipts.text}
+
+
+def build_receipt_rows(checks: list) -> list:
+    return [
+        {
+            "check_id": check.id,
+            "template_digest": get_template_digest(),
+            "html": gzip.compress(render_receipt(check)),
+            "text": gzip.compress(render_text_receipt(check)),
+        }
+        for check in checks
+    ]
+
+
+async def prerender_receipts(check_ids: list):
+    """Render and store receipts of freshly created checks.
+
+    Runs as a background task after the response is sent, so it opens its
+    own session and renders in the threadpool to keep the event loop free.
+    """
+    for start in range(0, len(check_ids), Config.RECEIPT_PRERENDER_CHUNK_SIZE):
+        chunk = check_ids[start : start + Config.RECEIPT_PRERENDER_CHUNK_SIZE]
+        async with AsyncSessionLocal() as db:
+            checks = await db.scalars(
+                select(models.Checks)
+                .filter(models.Checks.id.in_(chunk))
+                .options(selectinload(models.Checks.products))
+            )
+            rows = await run_in_threadpool(build_receipt_rows, checks.all())
+            if rows:
+                await db.execute(insert(models.Receipts).on_conflict_do_nothing(), rows)
+                await db.commit()
+
+
+async def get_stored_receipt(
+    check_id: int, db: AsyncSession, receipt_format: str = "html"
+) -> Optional[bytes]:
+    body = await db.scalar(
+        select(STORED_RECEIPT_COLUMNS[receipt_format]).filter(
+            models.Receipts.check_id == check_id,
+            models.Receipts.template_digest == get_template_digest(),
+        )
+    )
+
+    return gzip.decompress(body) if body is not None else None
+
+
+async def get_rendered_receipt(
+    check_id: str, db: AsyncSession, receipt_format: str = "html"
+) -> Optional[bytes]:
+    cache_key = (int(check_id), receipt_format)
+    body = receipt_cache.get(cache_key)
+    if body is not None:
+        return body
+
+    shared_key = get_shared_receipt_key(cache_key[0], receipt_format)
+    if shared_receipt_backend is not None:
+        body = await shared_receipt_backend.get(shared_key)
+        if body is not None:
+            receipt_cache.set(cache_key, body)
+            return body
+
+    if Config.RECEIPT_PRERENDER and receipt_format in STORED_RECEIPT_COLUMNS:
+        body = await get_stored_receipt(
+            check_id=cache_key[0], db=db, receipt_format=receipt_format
+        )
+    if body is None:
+        check = await get_check_by_id(check_id=check_id, db=db)
+        if not check:
+            return None
+        body = RECEIPT_RENDERERS[receipt_format](check)
+
+    receipt_cache.set(cache_key, body)
+    if shared_receipt_backend is not None:
+        await shared_receipt_backend.set(shared_key, body, Config.RECEIPT_CACHE_TTL)
+
+    return body
+
+
+async def evict_receipts(check_ids: list):
+    """Drop the cached receipts of deleted checks.
+
+    They leave this worker's cache and the shared store; other workers keep
+    theirs for at most RECEIPT_CACHE_TTL.
+    """
+    for check_id in check_ids:
+        for receipt_format in RECEIPT_RENDERERS:
+            receipt_cache.discard((check_id, receipt_format))
+            if shared_receipt_backend is not None:
+                await shared_receipt_backend.delete(
+                    get_shared_receipt_key(check_id, receipt_format)
+                )
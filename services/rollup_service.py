@@ -0,0 +1,102 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+
+async def add_daily_check_totals(
+    user_id: int, day: datetime.date, totals: dict, db: AsyncSession
+):
+    """Add {payment_type: (check_count, total)} to the user's rollup of a day.
+
+    Runs in the caller's transaction, so the rollup is committed together
+    with the checks it counts. Rows are upserted in payment type order to
+    keep concurrent writers of the same user from deadlocking.
+    """
+    rows = [
+        {
+            "user_id": user_id,
+            "day": day,
+            "payment_type": payment_type,
+            "check_count": check_count,
+            "total": total,
+        }
+        for payment_type, (check_count, total) in sorted(totals.items())
+    ]
+    query = insert(models.DailyCheckTotals).values(rows)
+    await db.execute(
+        query.on_conflict_do_update(
+            index_elements=["user_id", "day", "payment_type"],
+            set_={
+                "check_count": models.DailyCheckTotals.check_count
+                + query.excluded.check_count,
+                "total": models.DailyCheckTotals.total + query.excluded.total,
+            },
+        )
+    )
+
+
+def get_rollup_conditions(
+    user_column, day, user_id: Optional[int], date_from, date_to
+) -> list:
+    conditions = []
+    if user_id is not None:
+        conditions.append(user_column == user_id)
+    if date_from is not None:
+        conditions.append(day >= date_from)
+    if date_to is not None:
+        conditions.append(day <= date_to)
+
+    return conditions
+
+
+async def backfill_daily_check_totals(
+    db: AsyncSession,
+    user_id: Optional[int] = None,
+    date_from: Optional[datetime.date] = None,
+    date_to: Optional[datetime.date] = None,
+) -> int:
+    """Rebuild rollups from the checks table, optionally for one user or days.
+
+    The table lock makes concurrent check inserts wait at their rollup upsert
+    until the rebuilt rows are committed, so no check is counted twice or
+    lost. Returns the number of rollup rows written.
+    """
+    rollups = models.DailyCheckTotals.__table__
+    checks = models.Checks.__table__
+    day = func.date(checks.c.created_at)
+
+    await db.execute(text("LOCK TABLE daily_check_totals IN SHARE ROW EXCLUSIVE MODE"))
+    await db.execute(
+        delete(rollups).where(
+            *get_rollup_conditions(
+                rollups.c.user_id, rollups.c.day, user_id, date_from, date_to
+            )
+        )
+    )
+    result = await db.execute(
+        insert(rollups).from_select(
+            ["user_id", "day", "payment_type", "check_count", "total"],
+            select(
+                checks.c.user_id,
+                day,
+                checks.c.payment_type,
+                func.count(),
+                func.sum(checks.c.total),
+            )
+            .where(
+                checks.c.created_at.is_not(None),
+                *get_rollup_conditions(
+                    checks.c.user_id, day, user_id, date_from, date_to
+                ),
+            )
+            .group_by(checks.c.user_id, day, checks.c.payment_type),
+        )
+    )
+    await db.commit()
+
+    return result.rowcount
@@ -0,0 +1,157 @@
+import datetime
+
+from sqlalchemy import DateTime, cast, desc, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from utils.exceptions import bad_request_exception
+from utils.money import CENT, ZERO
+
+
+def parse_stats_range(date_from: str, date_to: str) -> tuple:
+    try:
+        date_from = datetime.datetime.strptime(date_from, "%d/%m/%Y")
+        # date_to is inclusive, so the range ends at the start of the next day
+        date_to = datetime.datetime.strptime(date_to, "%d/%m/%Y")
+    except ValueError:
+        raise bad_request_exception(detail="Invalid date")
+
+    return date_from, date_to + datetime.timedelta(days=1)
+
+
+def get_period_start(period: str, column):
+    # Rendered inline so SELECT and GROUP BY share one expression instead of
+    # two separate bind parameters. period is one of day/week/month.
+    return func.date_trunc(literal_column(f"'{period}'"), column)
+
+
+def build_totals() -> dict:
+    return {
+        "revenue": ZERO,
+        "check_count": 0,
+        "average_basket": ZERO,
+        "payment_types": {},
+    }
+
+
+def add_payment_type_totals(totals: dict, payment_type: str, count: int, revenue):
+    payment_type_totals = totals["payment_types"].setdefault(
+        payment_type, {"check_count": 0, "revenue": ZERO}
+    )
+    payment_type_totals["check_count"] += count
+    payment_type_totals["revenue"] += revenue
+    totals["check_count"] += count
+    totals["revenue"] += revenue
+    totals["average_basket"] = (totals["revenue"] / totals["check_count"]).quantize(
+        CENT
+    )
+
+
+async def get_check_totals(
+    user_id: int, period: str, date_from, date_to, db: AsyncSession
+) -> list:
+    # Read from the daily rollups, so the cost depends on the number of days
+    # in the range rather than on the number of checks.
+    period_start = get_period_start(period, cast(models.DailyCheckTotals.day, DateTime))
+    rows = await db.execute(
+        select(
+            period_start,
+            models.DailyCheckTotals.payment_type,
+            func.sum(models.DailyCheckTotals.check_count),
+            func.sum(models.DailyCheckTotals.total),
+        )
+        .filter(
+            models.DailyCheckTotals.user_id == user_id,
+            models.DailyCheckTotals.day >= date_from.date(),
+            models.DailyCheckTotals.day < date_to.date(),
+        )
+        .group_by(period_start, models.DailyCheckTotals.payment_type)
+    )
+
+    return [(start.date(), *totals) for start, *totals in rows]
+
+
+async def get_top_products(
+    user_id: int, period: str, date_from, date_to, limit: int, db: AsyncSession
+) -> list:
+    period_start = get_period_start(period, models.Checks.created_at)
+    revenue = func.sum(models.Products.total)
+    product_totals = (
+        select(
+            period_start.label("period_start"),
+            models.Products.name,
+            func.sum(models.Products.quantity).label("quantity"),
+            revenue.label("revenue"),
+            func.row_number()
+            .over(partition_by=period_start, order_by=desc(revenue))
+            .label("rank"),
+        )
+        .join(models.Checks, models.Checks.id == models.Products.check_id)
+        .filter(
+            models.Checks.user_id == user_id,
+            models.Checks.created_at >= date_from,
+            models.Checks.created_at < date_to,
+        )
+        .group_by(period_start, models.Products.name)
+        .subquery()
+    )
+    rows = await db.execute(
+        select(
+            product_totals.c.period_start,
+            product_totals.c.name,
+            product_totals.c.quantity,
+            product_totals.c.revenue,
+        )
+        .filter(product_totals.c.rank <= limit)
+        .order_by(product_totals.c.period_start, product_totals.c.rank)
+    )
+
+    return [(start.date(), *totals) for start, *totals in rows]
+
+
+async def get_check_stats(user_id: int, filters: dict, db: AsyncSession) -> dict:
+    date_from, date_to = parse_stats_range(filters["date_from"], filters["date_to"])
+
+    buckets, summary = {}, build_totals()
+
+    def get_bucket(period_start) -> dict:
+        # The products are read in a separate statement from the rollups, so a
+        # check committed in between can name a period the rollups lack.
+        if period_start not in buckets:
+            buckets[period_start] = {
+                "period_start": period_start,
+                **build_totals(),
+                "top_products": [],
+            }
+        return buckets[period_start]
+
+    for period_start, payment_type, count, revenue in await get_check_totals(
+        user_id=user_id,
+        period=filters["period"],
+        date_from=date_from,
+        date_to=date_to,
+        db=db,
+    ):
+        add_payment_type_totals(get_bucket(period_start), payment_type, count, revenue)
+        add_payment_type_totals(summary, payment_type, count, revenue)
+
+    if filters["top_products"]:
+        for period_start, name, quantity, revenue in await get_top_products(
+            user_id=user_id,
+            period=filters["period"],
+            date_from=date_from,
+            date_to=date_to,
+            limit=filters["top_products"],
+            db=db,
+        ):
+            get_bucket(period_start)["top_products"].append(
+                {"name": name, "quantity": quantity, "revenue": revenue}
+            )
+
+    response_data = {
+        "period": filters["period"],
+        "summary": summary,
+        "buckets": sorted(buckets.values(), key=lambda bucket: bucket["period_start"]),
+    }
+
+    return response_data
@@ -1,14 +1,43 @@
+import asyncio
+import base64
 import copy
+import csv
 import datetime
+import io
 import json
 import random
+import re
 import string
+import time
+import zipfile
 from typing import List
 
+import psycopg2
 import pytest
+import pytest_asyncio
+from fastapi import FastAPI, HTTPException
 from httpx import AsyncClient
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
 
+import controlers
+import database
+import models
+from config import Config
+from database import AsyncSessionLocal
 from main import app
+from schemas.check_schema import Order
+from services import (
+    auth_service,
+    check_service,
+    check_writer_service,
+    export_service,
+    receipt_job_service,
+    receipt_service,
+    rollup_service,
+)
+from utils import hash_pool
+from utils import metrics as request_metrics
 
 
 def generate_random_value(length: int = 10) -> str:
@@ -177,6 +206,821 @@ async def test_creads_already_exist(test_created_user, test_client):
     await anext(test_created_user)
 
 
+@pytest.mark.asyncio
+async def test_read_all_cursor_pagination(
+    test_client, test_access_token, test_created_user
+):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+    created_ids = []
+    for _ in range(3):
+        response = await client.post("/checks/", json=payload, headers=headers)
+        created_ids.append(response.json()["id"])
+
+    seen_ids, cursor = [], ""
+    for expected_page_size in (2, 1):
+        response = await client.get(
+            "/checks/", params={"per_page": 2, "cursor": cursor}, headers=headers
+        )
+        response_data = response.json()
+        assert response.status_code == 200
+        assert len(response_data["checks"]) == expected_page_size
+        assert response_data["total_count"] == 3
+        seen_ids += [check["check_id"] for check in response_data["checks"]]
+        cursor = response_data["next_cursor"]
+    assert cursor is None
+    assert seen_ids == created_ids
+
+    response = await client.get(
+        "/checks/", params={"include_count": False}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["total_count"] is None
+
+    # Undecodable, an id outside the integer column and an aware timestamp.
+    for cursor in (
+        b"not-a-cursor",
+        base64.urlsafe_b64encode(b'["2020-01-01T00:00:00", 100000000000000000000]'),
+        base64.urlsafe_b64encode(b'["2020-01-01T00:00:00+02:00", 1]'),
+    ):
+        params = {"cursor": cursor.decode()}
+        response = await client.get("/checks/", params=params, headers=headers)
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_check_count_cache_bounded(
+    test_client, test_access_token, test_created_user
+):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    _, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+    for total_from in range(check_service.CHECK_COUNT_KEYS_PER_USER + 8):
+        response = await client.get(
+            "/checks/", params={"total_from": total_from}, headers=headers
+        )
+        assert response.json()["total_count"] == 0
+
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(
+            select(models.Users.id).filter(models.Users.username == USER_NAME)
+        )
+    user_counts = check_service.check_count_cache[user_id]
+    assert len(user_counts) == check_service.CHECK_COUNT_KEYS_PER_USER
+    assert ("0", "", "", "") not in user_counts
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_create_checks_batch(test_client, test_access_token, test_created_user):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    underpaid_payload = copy.deepcopy(payload)
+    underpaid_payload["payment"]["amount"] = 1.0
+    client = await anext(test_client)
+    response = await client.post(
+        "/checks/batch", json=[payload, underpaid_payload, payload], headers=headers
+    )
+
+    response_data = response.json()
+    assert response.status_code == 201
+    assert response_data["created"] == 2
+    assert response_data["failed"] == 1
+    assert [result["index"] for result in response_data["results"]] == [0, 1, 2]
+    assert "id" not in response_data["results"][1]
+    assert response_data["results"][1]["detail"] == (
+        "Payment amount cannot be less than total product's cost"
+    )
+    for result in (response_data["results"][0], response_data["results"][2]):
+        assert ANSWERS["total"] == result["total"]
+        assert ANSWERS["rest"] == result["rest"]
+
+    response = await client.get("/checks/", headers=headers)
+    response_data = response.json()
+    assert response_data["total_count"] == 2
+    for check in response_data["checks"]:
+        check_products(check["products"])
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_view_prerendered_check(
+    test_client, test_access_token, test_created_user, monkeypatch
+):
+    monkeypatch.setattr(Config, "RECEIPT_PRERENDER", True)
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+    response = await client.post("/checks/", json=payload, headers=headers)
+    assert response.status_code == 201
+
+    def fail_render(check):
+        raise AssertionError("Pre-rendered receipt was not used")
+
+    monkeypatch.setitem(receipt_service.RECEIPT_RENDERERS, "html", fail_render)
+    monkeypatch.setitem(receipt_service.RECEIPT_RENDERERS, "txt", fail_render)
+    response = await client.get("/checks/", headers=headers)
+    check = response.json()["checks"][0]
+    html_response = await client.get(check["url"])
+    assert html_response.status_code == 200
+    assert check["buyer_name"] in html_response.text
+    text_response = await client.get(check["url"], params={"format": "txt"})
+    assert text_response.status_code == 200
+    assert check["buyer_name"] in text_response.text
+    await anext(test_created_user)
+
+
+def get_receipt_lines(html: str) -> list:
+    body = html[html.index("<body>") : html.index("</body>")]
+    chunks = re.split(r"<br>|</div>", body)
+    lines = [" ".join(re.sub(r"<[^>]+>", " ", chunk).split()) for chunk in chunks]
+
+    return [line for line in lines if line]
+
+
+@pytest.mark.asyncio
+async def test_view_check_thermal_formats(
+    test_client, test_access_token, test_created_user
+):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+    await client.post("/checks/", json=payload, headers=headers)
+    response = await client.get("/checks/", headers=headers)
+    url = response.json()["checks"][0]["url"]
+
+    html_response = await client.get(url)
+    text_response = await client.get(url, params={"format": "txt"})
+    escpos_response = await client.get(url, params={"format": "escpos"})
+    assert text_response.status_code == escpos_response.status_code == 200
+    assert text_response.headers["Content-Type"] == "text/plain; charset=utf-8"
+    assert escpos_response.headers["Content-Type"] == "application/octet-stream"
+    assert len({html_response.headers["ETag"], text_response.headers["ETag"]}) == 2
+
+    # The dashed rules are the CSS borders between products in the HTML.
+    text_lines = [
+        " ".join(line.split())
+        for line in text_response.text.splitlines()
+        if line.strip("-")
+    ]
+    assert text_lines == get_receipt_lines(html_response.text)
+    assert all(len(line) <= 48 for line in text_response.text.splitlines())
+
+    escpos = escpos_response.content
+    assert escpos.startswith(b"\x1b@\x1bt\x2e")
+    assert "Дякуємо за покупку!".encode("cp1251") in escpos
+    bold = escpos[escpos.index(b"\x1bE\x01") + 3 : escpos.index(b"\x1bE\x00")]
+    assert bold.startswith("СУМА".encode("cp1251"))
+
+    response = await client.get(url, params={"format": "pdf"})
+    assert response.status_code == 422
+
+    long_name = "Samsung Galaxy S24 Ultra 512GB Phantom Black ed"
+    payload["buyer_name"] = " ".join(["FOP"] + ["Pytest"] * 10)
+    payload["products"] = [{"name": long_name, "price": 1234.56, "quantity": 1}]
+    payload["payment"]["amount"] = 2000.0
+    await client.post("/checks/", json=payload, headers=headers)
+    response = await client.get("/checks/", headers=headers)
+    url = response.json()["checks"][-1]["url"]
+    text_response = await client.get(url, params={"format": "txt"})
+    text_lines = text_response.text.splitlines()
+    assert all(len(line) <= 48 for line in text_lines)
+    assert text_lines[0] == payload["buyer_name"][:48]
+    assert text_lines[3] == f"{long_name[:40]} 1234.56"
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_unsubscribe_evicts_receipts(
+    test_client, test_access_token, test_created_user
+):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+    await client.post("/checks/", json=payload, headers=headers)
+    response = await client.get("/checks/", headers=headers)
+    url = response.json()["checks"][0]["url"]
+    response = await client.get(url)
+    assert response.status_code == 200
+
+    await anext(test_created_user)
+    client = await anext(test_client)
+    response = await client.get(url)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_bulk_receipt_job(
+    test_client, test_access_token, test_created_user, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(Config, "RECEIPT_JOB_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "RECEIPT_JOB_CHUNK_SIZE", 2)
+    monkeypatch.setattr(Config, "RECEIPT_RENDER_WORKERS", 2)
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+    for _ in range(3):
+        await client.post("/checks/", json=payload, headers=headers)
+    response = await client.get("/checks/", headers=headers, params={"per_page": 5})
+    urls = [check["url"] for check in response.json()["checks"]]
+
+    # The test client returns once the background task has run.
+    response = await client.post(
+        "/checks/receipts/bulk", headers=headers, params={"format": "txt"}
+    )
+    assert response.status_code == 202
+    job = response.json()
+    assert job["total"] == 3
+    assert job["download_url"] is None
+
+    response = await client.get(job["status_url"], headers=headers)
+    job = response.json()
+    assert job["status"] == "done"
+    assert job["rendered"] == 3
+    assert job["progress"] == 1.0
+
+    response = await client.get(job["download_url"], headers=headers)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    receipts = {
+        name.rsplit("check_", 1)[1]: archive.read(name) for name in archive.namelist()
+    }
+    assert len(receipts) == 3
+    for url in urls:
+        check_id = url.split("/")[-3]
+        text_response = await client.get(url, params={"format": "txt"})
+        assert receipts[f"{check_id}.txt"] == text_response.content
+
+    response = await client.get("/checks/receipts/bulk/missing", headers=headers)
+    assert response.status_code == 404
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_bulk_receipt_job_failure(test_created_user, monkeypatch, tmp_path):
+    # A file where the job directory should be makes the archive unwritable.
+    job_dir = tmp_path / "jobs"
+    job_dir.write_text("")
+    monkeypatch.setattr(Config, "RECEIPT_JOB_DIR", str(job_dir))
+    await anext(test_created_user)
+    filters = {"total_from": 0, "date_from": "", "date_to": "", "payment_type": ""}
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(
+            select(models.Users.id).filter(models.Users.username == USER_NAME)
+        )
+        job = await receipt_job_service.create_receipt_job(
+            filters=filters, user_id=user_id, receipt_format="txt", db=db
+        )
+
+    with pytest.raises(FileExistsError):
+        await receipt_job_service.run_receipt_job(
+            job_id=job.id, filters=filters, user_id=user_id, receipt_format="txt"
+        )
+
+    async with AsyncSessionLocal() as db:
+        job = await receipt_job_service.get_receipt_job(
+            job_id=job.id, user_id=user_id, db=db
+        )
+    assert job.status == receipt_job_service.JOB_FAILED
+    assert job.finished_at is not None
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_fast_json_responses_match_default(
+    test_client, test_access_token, test_created_user, monkeypatch
+):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+
+    monkeypatch.setattr(Config, "FAST_JSON_RESPONSES", True)
+    response = await client.post("/checks/", json=payload, headers=headers)
+    response_data = response.json()
+    assert response.status_code == 201
+    assert isinstance(response_data["created_at"], str)
+    assert ANSWERS["total"] == response_data["total"]
+    assert ANSWERS["rest"] == response_data["rest"]
+    check_products(response_data["products"])
+
+    fast_response = await client.get("/checks/", headers=headers)
+    monkeypatch.setattr(Config, "FAST_JSON_RESPONSES", False)
+    default_response = await client.get("/checks/", headers=headers)
+    assert fast_response.status_code == default_response.status_code == 200
+    assert fast_response.json() == default_response.json()
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_export_checks(test_client, test_access_token, test_created_user):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+    await client.post("/checks/batch", json=[payload, payload], headers=headers)
+    listing = await client.get("/checks/", headers=headers)
+
+    response = await client.get("/checks/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    exported_checks = [json.loads(line) for line in response.text.splitlines()]
+    assert exported_checks == listing.json()["checks"]
+
+    response = await client.get(
+        "/checks/export",
+        params={"format": "csv", "payment_type": "cashless"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.text.splitlines() == [",".join(export_service.CSV_HEADER)]
+
+    response = await client.get(
+        "/checks/export", params={"format": "csv"}, headers=headers
+    )
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 2 * len(ANSWERS["products"])
+    for idx, row in enumerate(rows):
+        product_answers = ANSWERS["products"][idx % len(ANSWERS["products"])]
+        assert row["product_name"] == product_answers["name"]
+        assert float(row["product_total"]) == product_answers["total"]
+        assert float(row["rest"]) == ANSWERS["rest"]
+
+    # Filters are checked before the response starts streaming.
+    for params, detail in (
+        ({"total_from": "."}, "Invalid total_from"),
+        ({"date_from": "31/02/2023"}, "Invalid date"),
+    ):
+        response = await client.get("/checks/export", params=params, headers=headers)
+        assert response.status_code == 400
+        assert response.json()["detail"] == detail
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_verified_token_cache(test_client, test_access_token, test_created_user):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    headers = {"Authorization": f"Bearer {token}"}
+    client = await anext(test_client)
+
+    response = await client.get("/checks/", headers=headers)
+    assert response.status_code == 200
+    hits = auth_service.token_cache_stats["hits"]
+    response = await client.get("/checks/", headers=headers)
+    assert response.status_code == 200
+    assert auth_service.token_cache_stats["hits"] == hits + 1
+
+    expires_at, user = auth_service.token_cache[token]
+    auth_service.token_cache[token] = (int(time.time()) - 1, user)
+    misses = auth_service.token_cache_stats["misses"]
+    response = await client.get("/checks/", headers=headers)
+    assert auth_service.token_cache_stats["misses"] == misses + 1
+    assert auth_service.token_cache[token][0] == expires_at
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_read_stats(test_client, test_access_token, test_created_user):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    cashless_payload = copy.deepcopy(payload)
+    cashless_payload["payment"]["type"] = "cashless"
+    client = await anext(test_client)
+    await client.post(
+        "/checks/batch", json=[payload, payload, cashless_payload], headers=headers
+    )
+
+    today = datetime.datetime.utcnow().strftime("%d/%m/%Y")
+    response = await client.get(
+        "/checks/stats",
+        params={"date_from": today, "date_to": today, "period": "month"},
+        headers=headers,
+    )
+    response_data = response.json()
+    assert response.status_code == 200
+    assert response_data["period"] == "month"
+    assert len(response_data["buckets"]) == 1
+    for totals in (response_data["summary"], response_data["buckets"][0]):
+        assert totals["check_count"] == 3
+        assert totals["revenue"] == 3 * ANSWERS["total"]
+        assert totals["average_basket"] == ANSWERS["total"]
+        assert totals["payment_types"]["cash"]["check_count"] == 2
+        assert totals["payment_types"]["cashless"]["revenue"] == ANSWERS["total"]
+
+    top_products = response_data["buckets"][0]["top_products"]
+    assert [product["name"] for product in top_products] == [
+        product["name"] for product in ANSWERS["products"]
+    ]
+    assert top_products[0]["quantity"] == 3
+    assert top_products[0]["revenue"] == 3 * ANSWERS["products"][0]["total"]
+
+    response = await client.get(
+        "/checks/stats",
+        params={"date_from": "01/01/2000", "date_to": "02/01/2000"},
+        headers=headers,
+    )
+    assert response.json()["buckets"] == []
+    assert response.json()["summary"]["check_count"] == 0
+
+    response = await client.get(
+        "/checks/stats",
+        params={"date_from": "31/02/2023", "date_to": today},
+        headers=headers,
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid date"
+
+    # Checks whose rollups are missing still list their top products.
+    async with AsyncSessionLocal() as db:
+        user_id = await db.scalar(
+            select(models.Users.id).filter(models.Users.username == USER_NAME)
+        )
+        await db.execute(
+            models.DailyCheckTotals.__table__.delete().where(
+                models.DailyCheckTotals.user_id == user_id
+            )
+        )
+        await db.commit()
+    response = await client.get(
+        "/checks/stats",
+        params={"date_from": today, "date_to": today, "period": "month"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["buckets"][0]["check_count"] == 0
+    assert len(response.json()["buckets"][0]["top_products"]) == 3
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_backfill_daily_check_totals(
+    test_client, test_access_token, test_created_user
+):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+    await client.post("/checks/", json=payload, headers=headers)
+    response = await client.post("/checks/batch", json=[payload] * 2, headers=headers)
+    check_id = response.json()["results"][0]["id"]
+
+    async def get_rollups():
+        async with AsyncSessionLocal() as db:
+            user_id = await db.scalar(
+                select(models.Checks.user_id).filter(models.Checks.id == check_id)
+            )
+            rollups = await db.execute(
+                select(
+                    models.DailyCheckTotals.payment_type,
+                    models.DailyCheckTotals.check_count,
+                    models.DailyCheckTotals.total,
+                ).filter(models.DailyCheckTotals.user_id == user_id)
+            )
+            return user_id, rollups.all()
+
+    user_id, maintained = await get_rollups()
+    assert [(row.check_count, float(row.total)) for row in maintained] == [
+        (3, 3 * ANSWERS["total"])
+    ]
+
+    async with AsyncSessionLocal() as db:
+        rows = await rollup_service.backfill_daily_check_totals(db=db, user_id=user_id)
+    assert rows == 1
+    assert (await get_rollups())[1] == maintained
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_request_instrumentation(
+    test_access_token, test_created_user, monkeypatch
+):
+    monkeypatch.setattr(Config, "METRICS_ENABLED", True)
+    monkeypatch.setattr(Config, "SERVER_TIMING_ENABLED", True)
+    instrumented_app = FastAPI()
+    for router in (
+        controlers.auth.router,
+        controlers.check.router,
+        controlers.metrics.router,
+    ):
+        instrumented_app.include_router(router)
+    request_metrics.setup_instrumentation(instrumented_app)
+
+    try:
+        await anext(test_created_user)
+        token = await anext(test_access_token)
+        async with AsyncClient(
+            app=instrumented_app, base_url="http://0.0.0.0:8000"
+        ) as client:
+            response = await client.get(
+                "/checks/", headers={"Authorization": f"Bearer {token}"}
+            )
+            assert response.status_code == 200
+            assert "db;dur=" in response.headers["Server-Timing"]
+            assert 'desc="2 queries"' in response.headers["Server-Timing"]
+
+            response = await client.get("/metrics")
+    finally:
+        request_metrics.uninstrument_engine()
+
+    assert response.status_code == 200
+    assert (
+        'http_requests_total{method="GET",route="/checks/",status="200"} 1'
+        in response.text
+    )
+    assert (
+        'http_request_db_queries_total{method="GET",route="/checks/"} 2'
+        in response.text
+    )
+    completed = hash_pool.hash_pool_stats["completed"]
+    assert f"password_hash_completed_total {completed}" in response.text
+    assert "password_hash_queue_wait_seconds_max " in response.text
+    hits = auth_service.token_cache_stats["hits"]
+    assert f"token_cache_hits_total {hits}" in response.text
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_readiness_probe():
+    probed_app = FastAPI()
+    probed_app.include_router(controlers.health.router)
+    async with AsyncClient(app=probed_app, base_url="http://0.0.0.0:8000") as client:
+        response = await client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+
+@pytest.mark.asyncio
+async def test_admin_pool_status(monkeypatch):
+    monkeypatch.setattr(Config, "ADMIN_API_TOKEN", "admin-token")
+    admin_app = FastAPI()
+    admin_app.include_router(controlers.admin.router)
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("SELECT 1"))
+
+    async with AsyncClient(app=admin_app, base_url="http://0.0.0.0:8000") as client:
+        response = await client.get("/admin/pool", headers={"X-Admin-Token": "wrong"})
+        assert response.status_code == 401
+
+        response = await client.get(
+            "/admin/pool", headers={"X-Admin-Token": "admin-token"}
+        )
+
+    response_data = response.json()
+    assert response.status_code == 200
+    assert response_data["pool_size"] == Config.DB_POOL_SIZE
+    assert response_data["checked_out"] == 0
+    assert response_data["idle"] >= 1
+    assert response_data["checkouts"] >= 1
+    assert response_data["timeouts"] == 0
+
+
+@pytest.mark.asyncio
+async def test_pgbouncer_engine_options(monkeypatch):
+    monkeypatch.setattr(Config, "DB_PGBOUNCER", True)
+    options = database.get_engine_options()
+    assert options["connect_args"]["statement_cache_size"] == 0
+
+    engine = create_async_engine(database.ASYNC_SQLALCHEMY_DATABASE_URL, **options)
+    async with engine.connect() as connection:
+        assert await connection.scalar(text("SELECT 1")) == 1
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_create_check_idempotency_key(
+    test_client, test_access_token, test_created_user
+):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+
+    async def count_user_checks(check_id):
+        async with AsyncSessionLocal() as db:
+            user_id = select(models.Checks.user_id).filter(models.Checks.id == check_id)
+            return await db.scalar(
+                select(func.count()).filter(
+                    models.Checks.user_id == user_id.scalar_subquery()
+                )
+            )
+
+    first, retry = [
+        await client.post(
+            "/checks/", json=payload, headers={**headers, "Idempotency-Key": "retry"}
+        )
+        for _ in range(2)
+    ]
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert await count_user_checks(first.json()["id"]) == 1
+
+    other_payload = {**payload, "buyer_name": "FOP Pytest 2"}
+    response = await client.post(
+        "/checks/", json=other_payload, headers={**headers, "Idempotency-Key": "retry"}
+    )
+    assert response.status_code == 422
+
+    concurrent = await asyncio.gather(
+        *(
+            client.post(
+                "/checks/",
+                json=payload,
+                headers={**headers, "Idempotency-Key": "concurrent"},
+            )
+            for _ in range(5)
+        )
+    )
+    assert {response.status_code for response in concurrent} == {201}
+    assert len({response.json()["id"] for response in concurrent}) == 1
+    assert await count_user_checks(first.json()["id"]) == 2
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_group_commit_writer(
+    test_client, test_access_token, test_created_user, monkeypatch
+):
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+
+    batch_sizes = []
+    commit_checks = check_writer_service.commit_checks
+
+    async def record_commit_checks(batch):
+        batch_sizes.append(len(batch))
+        return await commit_checks(batch)
+
+    monkeypatch.setattr(check_writer_service, "commit_checks", record_commit_checks)
+    monkeypatch.setattr(Config, "GROUP_COMMIT_WINDOW_MS", 50.0)
+    check_writer_service.check_writer.start()
+    try:
+        responses = await asyncio.gather(
+            *(client.post("/checks/", json=payload, headers=headers) for _ in range(8))
+        )
+        underpaid_payload = copy.deepcopy(payload)
+        underpaid_payload["payment"]["amount"] = 1.0
+        response = await client.post(
+            "/checks/", json=underpaid_payload, headers=headers
+        )
+        assert response.status_code == 400
+    finally:
+        await check_writer_service.check_writer.stop()
+
+    assert {response.status_code for response in responses} == {201}
+    assert len({response.json()["id"] for response in responses}) == 8
+    assert sum(batch_sizes) == 8
+    assert len(batch_sizes) < 8
+    for response in responses:
+        assert ANSWERS["total"] == response.json()["total"]
+        check_products(response.json()["products"])
+
+    response = await client.get("/checks/", headers=headers)
+    assert response.json()["total_count"] == 8
+    today = datetime.datetime.utcnow().strftime("%d/%m/%Y")
+    response = await client.get(
+        "/checks/stats",
+        params={"date_from": today, "date_to": today, "top_products": 0},
+        headers=headers,
+    )
+    assert response.json()["summary"]["check_count"] == 8
+
+    writer = check_writer_service.GroupCommitWriter()
+    writer.queue = asyncio.Queue(maxsize=1)
+    writer.queue.put_nowait(None)
+    with pytest.raises(HTTPException) as error:
+        await writer.add_check(Order(**payload), user_id=0)
+    assert error.value.status_code == 503
+    await anext(test_created_user)
+
+
+@pytest.mark.asyncio
+async def test_read_replica_routing(
+    test_client, test_access_token, test_created_user, monkeypatch
+):
+    # An empty copy of the schema plays a replica that has replayed nothing.
+    replica_url = f"{database.SQLALCHEMY_DATABASE_URL}_replica"
+    replica_name = replica_url.split("/")[-1]
+    monkeypatch.setattr(database, "DB_NAME", replica_name)
+    database.create_database_if_missing()
+    async_replica_url = replica_url.replace("postgresql://", "postgresql+asyncpg://")
+    replica_engine = create_async_engine(async_replica_url)
+    async with replica_engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+    await replica_engine.dispose()
+    monkeypatch.setattr(
+        database,
+        "READ_DATABASE_URLS",
+        [async_replica_url, "postgresql+asyncpg://postgres@localhost:1/replica"],
+    )
+
+    await anext(test_created_user)
+    token = await anext(test_access_token)
+    payload, headers = prepare_create_check_request(token)
+    client = await anext(test_client)
+    try:
+        await database.check_read_engines()
+        assert database.healthy_read_engines == database.read_engines[:1]
+        assert database.get_pool_status()["healthy_read_replicas"] == 1
+
+        response = await client.post("/checks/", json=payload, headers=headers)
+        write_lsn = response.headers[database.WRITE_LSN_HEADER]
+        cookie_lsn = client.cookies[database.WRITE_LSN_COOKIE]
+        assert cookie_lsn == write_lsn.replace("/", "-")
+        # The replica was checked before the write, so it has not replayed it.
+        params = {"include_count": False}
+        response = await client.get("/checks/", params=params, headers=headers)
+        assert len(response.json()["checks"]) == 1
+        url = response.json()["checks"][0]["url"]
+
+        client.cookies.clear()
+        response = await client.get(
+            "/checks/",
+            params=params,
+            headers={**headers, database.WRITE_LSN_HEADER: write_lsn},
+        )
+        assert len(response.json()["checks"]) == 1
+        response = await client.get("/checks/", params=params, headers=headers)
+        assert response.json()["checks"] == []
+        response = await client.get(url)
+        assert response.status_code == 200
+
+        # A replayed Idempotency-Key response carries the marker too.
+        key_headers = {**headers, "Idempotency-Key": generate_random_value()}
+        await client.post("/checks/", json=payload, headers=key_headers)
+        client.cookies.clear()
+        response = await client.post("/checks/", json=payload, headers=key_headers)
+        assert response.headers["Idempotent-Replayed"] == "true"
+        assert database.WRITE_LSN_HEADER in response.headers
+        assert database.WRITE_LSN_COOKIE in client.cookies
+    finally:
+        for engine in database.read_engines:
+            await engine.dispose()
+        database.read_engines.clear()
+        database.healthy_read_engines.clear()
+        database.replayed_lsns.clear()
+        await anext(test_created_user)
+        conn = psycopg2.connect(
+            dbname=Config.ADMIN_DB,
+            user=Config.ADMIN_DB_USER,
+            password=Config.ADMIN_DB_PASSWORD,
+            host=Config.DB_HOST,
+        )
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f'DROP DATABASE IF EXISTS "{replica_name}"')
+        conn.close()
+
+
+@pytest.mark.asyncio
+async def test_sign_up_hash_pool_saturated(test_client, monkeypatch):
+    monkeypatch.setattr(hash_pool, "MAX_PENDING", 0)
+    rejected = hash_pool.hash_pool_stats["rejected"]
+    creds = {
+        "email": f"test_{generate_random_value()}@example.com",
+        "username": f"test_{generate_random_value()}",
+        "password": PASSWORD,
+    }
+
+    client = await anext(test_client)
+    response = await client.post("/sign-up/", json=creds)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert hash_pool.hash_pool_stats["rejected"] == rejected + 1
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    # The async engine pools asyncpg connections, which are bound to the loop
+    # that opened them, so every test has to share one loop.
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest_asyncio.fixture(scope="session", autouse=True)
+async def app_lifespan(event_loop):
+    # httpx does not send lifespan events, so startup and shutdown run here.
+    async with app.router.lifespan_context(app):
+        yield
+
+
 @pytest.fixture
 async def test_client():
     while True:
@@ -246,8 +1090,22 @@ async def test_read_all(test_access_token, test_client):
         html_response = await client.get(check["url"])
         assert html_response.status_code == 200
         assert html_response.headers["Content-Type"] == "text/html; charset=utf-8"
+        assert html_response.headers["Cache-Control"].startswith("private")
+        assert "immutable" in html_response.headers["Cache-Control"]
         assert html_response.text
 
+        hits = receipt_service.receipt_cache.hits
+        cached_response = await client.get(check["url"])
+        assert cached_response.text == html_response.text
+        assert receipt_service.receipt_cache.hits == hits + 1
+
+        etag = html_response.headers["ETag"]
+        not_modified_response = await client.get(
+            check["url"], headers={"If-None-Match": etag}
+        )
+        assert not_modified_response.status_code == 304
+        assert not_modified_response.headers["ETag"] == etag
+
 
 @pytest.fixture
 async def test_access_token(test_client):
@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+from hypothesis import given
+from hypothesis import strategies as st
+
+from schemas.check_schema import Order
+from utils.money import CENT, get_order_totals
+
+cents = st.integers(min_value=1, max_value=10**8)
+quantities = st.integers(min_value=1, max_value=10**3)
+lines = st.lists(st.tuples(cents, quantities), min_size=1, max_size=200)
+
+
+def build_order(order_lines, payment_cents: int) -> Order:
+    # Amounts go through float, the way JSON clients send them.
+    return Order(
+        products=[
+            {"name": f"Product {idx}", "price": price / 100, "quantity": quantity}
+            for idx, (price, quantity) in enumerate(order_lines)
+        ],
+        payment={"type": "cash", "amount": payment_cents / 100},
+        buyer_name="FOP Hypothesis",
+    )
+
+
+@given(order_lines=lines, extra_cents=st.integers(min_value=0, max_value=10**6))
+def test_order_totals_are_exact(order_lines, extra_cents):
+    expected_cents = sum(price * quantity for price, quantity in order_lines)
+    order = build_order(order_lines, expected_cents + extra_cents)
+
+    line_totals, total = get_order_totals(order.products)
+    rest = order.payment.amount - total
+
+    assert line_totals == [
+        Decimal(price * quantity) / 100 for price, quantity in order_lines
+    ]
+    assert total == Decimal(expected_cents) / 100
+    assert rest == Decimal(extra_cents) / 100
+    assert total + rest == order.payment.amount
+    for amount in (*line_totals, total, rest):
+        assert amount == amount.quantize(CENT)
+
+
+@given(price=cents)
+def test_prices_keep_cents(price):
+    order = build_order([(price, 1)], price)
+
+    assert order.products[0].price == Decimal(price) / 100
+    assert order.products[0].price.as_tuple().exponent == -2
+
+
+def test_large_order_totals_are_exact():
+    order_lines = [(idx % 9973 + 1, idx % 7 + 1) for idx in range(10000)]
+    expected_cents = sum(price * quantity for price, quantity in order_lines)
+    order = build_order(order_lines, expected_cents)
+
+    line_totals, total = get_order_totals(order.products)
+
+    assert len(line_totals) == len(order_lines)
+    assert total == Decimal(expected_cents) / 100
+    assert order.payment.amount - total == 0
@@ -9,6 +9,24 @@ def bad_request_exception(detail):
     return HTTPException(status_code=400, detail=detail)
 
 
+def conflict_exception(detail):
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+
+def unprocessable_entity_exception(detail):
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail
+    )
+
+
+def service_unavailable_exception(detail):
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=detail,
+        headers={"Retry-After": "1"},
+    )
+
+
 def get_user_exception():
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
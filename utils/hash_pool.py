@@ -0,0 +1,72 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from utils.exceptions import service_unavailable_exception
+from utils.metrics import metrics_registry, render_stats
+
+# bcrypt releases the GIL while hashing, so a thread pool is enough to keep
+# the event loop free without paying for a process pool.
+hash_executor = ThreadPoolExecutor(
+    max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+MAX_PENDING = Config.PASSWORD_HASH_WORKERS + Config.PASSWORD_HASH_QUEUE_SIZE
+
+hash_pool_stats = {
+    "pending": 0,
+    "completed": 0,
+    "rejected": 0,
+    "queue_wait_seconds_total": 0.0,
+    "queue_wait_seconds_max": 0.0,
+    "hash_seconds_total": 0.0,
+    "hash_seconds_max": 0.0,
+}
+
+
+HASH_POOL_METRICS = {
+    "pending": ("gauge", "Password hashes running or queued."),
+    "completed": ("counter", "Password hashes finished."),
+    "rejected": ("counter", "Password hashes refused with 503, the queue full."),
+    "queue_wait_seconds_total": ("counter", "Time hashes waited for a thread."),
+    "queue_wait_seconds_max": ("gauge", "Longest wait of a hash for a thread."),
+    "hash_seconds_total": ("counter", "Time spent hashing."),
+    "hash_seconds_max": ("gauge", "Longest single hash."),
+}
+metrics_registry.add_collector(
+    lambda: render_stats("password_hash", hash_pool_stats, HASH_POOL_METRICS)
+)
+
+
+def _timed_call(func, args, submitted_at: float):
+    started_at = time.perf_counter()
+    result = func(*args)
+
+    return result, started_at - submitted_at, time.perf_counter() - started_at
+
+
+async def run_in_hash_pool(func, *args):
+    if hash_pool_stats["pending"] >= MAX_PENDING:
+        hash_pool_stats["rejected"] += 1
+        raise service_unavailable_exception(detail="Server is busy, try again later")
+
+    hash_pool_stats["pending"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        result, queue_wait, hash_time = await loop.run_in_executor(
+            hash_executor, _timed_call, func, args, time.perf_counter()
+        )
+    finally:
+        hash_pool_stats["pending"] -= 1
+
+    hash_pool_stats["completed"] += 1
+    hash_pool_stats["queue_wait_seconds_total"] += queue_wait
+    hash_pool_stats["hash_seconds_total"] += hash_time
+    hash_pool_stats["queue_wait_seconds_max"] = max(
+        hash_pool_stats["queue_wait_seconds_max"], queue_wait
+    )
+    hash_pool_stats["hash_seconds_max"] = max(
+        hash_pool_stats["hash_seconds_max"], hash_time
+    )
+
+    return result
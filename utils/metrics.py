@@ -0,0 +1,238 @@
+import logging
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RequestStats:
+    """Database work done while handling one request."""
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+current_request_stats: ContextVar = ContextVar("current_request_stats", default=None)
+
+
+class MetricsRegistry:
+    """Request and query counters rendered in the Prometheus text format.
+
+    Modules keeping their own stats add a collector, a callable returning
+    their lines in the same format, which render() appends.
+    """
+
+    def __init__(self):
+        self.requests = defaultdict(int)
+        self.durations = defaultdict(lambda: [0] * len(REQUEST_DURATION_BUCKETS))
+        self.duration_sums = defaultdict(float)
+        self.duration_counts = defaultdict(int)
+        self.db_queries = defaultdict(int)
+        self.db_seconds = defaultdict(float)
+        self.slow_queries = 0
+        self.collectors = []
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def observe_request(
+        self, method: str, route: str, status: int, seconds: float, stats
+    ):
+        key = (method, route)
+        self.requests[(method, route, status)] += 1
+        self.duration_sums[key] += seconds
+        self.duration_counts[key] += 1
+        buckets = self.durations[key]
+        for index, bound in enumerate(REQUEST_DURATION_BUCKETS):
+            if seconds <= bound:
+                buckets[index] += 1
+        self.db_queries[key] += stats.queries
+        self.db_seconds[key] += stats.db_seconds
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_total Handled requests.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            labels = f'method="{method}",route="{route}",status="{status}"'
+            lines.append(f"http_requests_total{{{labels}}} {count}")
+
+        lines += [
+            "# HELP http_request_duration_seconds Time to send the response.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), buckets in sorted(self.durations.items()):
+            labels = f'method="{method}",route="{route}"'
+            for bound, count in zip(REQUEST_DURATION_BUCKETS, buckets):
+                lines.append(
+                    f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} '
+                    f"{count}"
+                )
+            count = self.duration_counts[(method, route)]
+            lines += [
+                f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}',
+                f"http_request_duration_seconds_sum{{{labels}}} "
+                f"{self.duration_sums[(method, route)]:.6f}",
+                f"http_request_duration_seconds_count{{{labels}}} {count}",
+            ]
+
+        lines += [
+            "# HELP http_request_db_queries_total Queries run by requests.",
+            "# TYPE http_request_db_queries_total counter",
+        ]
+        for (method, route), count in sorted(self.db_queries.items()):
+            labels = f'method="{method}",route="{route}"'
+            lines.append(f"http_request_db_queries_total{{{labels}}} {count}")
+
+        lines += [
+            "# HELP http_request_db_seconds_total Time requests spent in queries.",
+            "# TYPE http_request_db_seconds_total counter",
+        ]
+        for (method, route), seconds in sorted(self.db_seconds.items()):
+            labels = f'method="{method}",route="{route}"'
+            lines.append(f"http_request_db_seconds_total{{{labels}}} {seconds:.6f}")
+
+        lines += [
+            "# HELP db_slow_queries_total Queries slower than SLOW_QUERY_THRESHOLD_MS.",
+            "# TYPE db_slow_queries_total counter",
+            f"db_slow_queries_total {self.slow_queries}",
+        ]
+        for collector in self.collectors:
+            lines += collector()
+
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+
+def render_stats(prefix: str, stats: dict, metrics: dict) -> list:
+    """Render the keys of a stats dict as metrics.
+
+    metrics maps each key to its metric type and help text; counters get
+    the _total suffix Prometheus expects.
+    """
+    lines = []
+    for key, (metric_type, help_text) in metrics.items():
+        name = f"{prefix}_{key}"
+        if metric_type == "counter" and not name.endswith("_total"):
+            name = f"{name}_total"
+        value = stats[key]
+        value = f"{value:.6f}" if isinstance(value, float) else value
+        lines += [
+            f"# HELP {name} {help_text}",
+            f"# TYPE {name} {metric_type}",
+            f"{name} {value}",
+        ]
+
+    return lines
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started_at = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context._query_started_at
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+
+    threshold = Config.SLOW_QUERY_THRESHOLD_MS
+    if threshold and seconds * 1000 >= threshold:
+        metrics_registry.slow_queries += 1
+        logger.warning("Slow query (%.1f ms): %s", seconds * 1000, statement)
+
+
+def instrument_engine(engine=Engine):
+    # Listening on the Engine class also covers engines created later, such
+    # as the lazily created application engine.
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def uninstrument_engine(engine=Engine):
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    event.remove(engine, "after_cursor_execute", after_cursor_execute)
+
+
+class TimingMiddleware:
+    """Time each request and count its queries by route template.
+
+    Adds a Server-Timing header when server_timing is set and feeds the
+    /metrics registry when record_metrics is set.
+    """
+
+    def __init__(self, app, server_timing: bool, record_metrics: bool):
+        self.app = app
+        self.server_timing = server_timing
+        self.record_metrics = record_metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        started_at = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    app_ms = (time.perf_counter() - started_at) * 1000
+                    header = (
+                        f"app;dur={app_ms:.1f}, "
+                        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"'
+                    )
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"server-timing", header.encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request_stats.reset(token)
+            if self.record_metrics:
+                route = scope.get("route")
+                metrics_registry.observe_request(
+                    method=scope["method"],
+                    route=route.path_format if route else UNMATCHED_ROUTE,
+                    status=status,
+                    seconds=time.perf_counter() - started_at,
+                    stats=stats,
+                )
+
+
+def setup_instrumentation(app):
+    """Wire whatever instrumentation is enabled; nothing is added otherwise."""
+    if Config.METRICS_ENABLED or Config.SERVER_TIMING_ENABLED:
+        app.add_middleware(
+            TimingMiddleware,
+            server_timing=Config.SERVER_TIMING_ENABLED,
+            record_metrics=Config.METRICS_ENABLED,
+        )
+    if (
+        Config.METRICS_ENABLED
+        or Config.SERVER_TIMING_ENABLED
+        or Config.SLOW_QUERY_THRESHOLD_MS
+    ):
+        instrument_engine()
@@ -0,0 +1,19 @@
+from decimal import Decimal
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+
+def to_money(value) -> Decimal:
+    return Decimal(value).quantize(CENT)
+
+
+def get_order_totals(products) -> tuple:
+    """Return per-line totals and the order total, both exact to the cent.
+
+    Prices are validated to two decimal places and quantities are integers,
+    so every product and the sum of them is exact without rounding.
+    """
+    line_totals = [product.price * product.quantity for product in products]
+
+    return line_totals, sum(line_totals, ZERO)
@@ -0,0 +1,84 @@
+"""Fixed-width receipts for 48-column thermal printers.
+
+Lays out the same lines as templates/check/check.html, in plain text or as
+ESC/POS bytes, without going through Jinja: the constant lines are built
+once at import and each receipt is a single join of formatted rows.
+"""
+
+RECEIPT_WIDTH = 48
+ESCPOS_ENCODING = "cp1251"
+
+DOUBLE_RULE = "=" * RECEIPT_WIDTH
+SINGLE_RULE = "-" * RECEIPT_WIDTH
+TOTAL_LABEL = "СУМА"
+PAYMENT_LABELS = {"cash": "Готівка"}
+CARD_LABEL = "Картка"
+REST_LABEL = "Решта"
+FOOTER = "Дякуємо за покупку!".center(RECEIPT_WIDTH).rstrip()
+
+ESCPOS_INIT = b"\x1b@"
+# ESC t 46 selects WPC1251, which has the Ukrainian letters CP866 lacks.
+ESCPOS_CODE_PAGE = b"\x1bt\x2e"
+ESCPOS_BOLD_ON = b"\x1bE\x01"
+ESCPOS_BOLD_OFF = b"\x1bE\x00"
+ESCPOS_FEED_AND_CUT = b"\x1bd\x03\x1dV\x01"
+
+
+def row(left: str, right: str) -> str:
+    # Long names are cut so at least one space separates them from the amount.
+    left = left[: RECEIPT_WIDTH - len(right) - 1]
+    return left + right.rjust(RECEIPT_WIDTH - len(left))
+
+
+def centre(text: str) -> str:
+    return text[:RECEIPT_WIDTH].center(RECEIPT_WIDTH).rstrip()
+
+
+def build_receipt_lines(check) -> list:
+    lines = [centre(check.buyer_name), DOUBLE_RULE]
+    for product in check.products:
+        lines += [
+            f"{product.quantity:.2f} x {product.price:.2f}",
+            row(product.name, f"{product.total:.2f}"),
+            SINGLE_RULE,
+        ]
+    lines += [
+        DOUBLE_RULE,
+        row(TOTAL_LABEL, f"{check.total:.2f}"),
+        row(
+            PAYMENT_LABELS.get(check.payment_type, CARD_LABEL),
+            f"{check.payment_amount:.2f}",
+        ),
+        row(REST_LABEL, f"{check.rest:.2f}"),
+        DOUBLE_RULE,
+        centre(check.created_at.strftime("%d.%m.%Y %H:%M")),
+        FOOTER,
+    ]
+
+    return lines
+
+
+def render_text_receipt(check) -> bytes:
+    return ("\n".join(build_receipt_lines(check)) + "\n").encode()
+
+
+def render_escpos_receipt(check) -> bytes:
+    lines = build_receipt_lines(check)
+    # The total row is followed by the payment and rest rows, the closing
+    # rule, the date and the footer; it is printed in bold.
+    total_index = len(lines) - 6
+    body = "\n".join(lines[:total_index]) + "\n"
+    tail = "\n" + "\n".join(lines[total_index + 1 :]) + "\n"
+
+    return b"".join(
+        (
+            ESCPOS_INIT,
+            ESCPOS_CODE_PAGE,
+            body.encode(ESCPOS_ENCODING, errors="replace"),
+            ESCPOS_BOLD_ON,
+            lines[total_index].encode(ESCPOS_ENCODING, errors="replace"),
+            ESCPOS_BOLD_OFF,
+            tail.encode(ESCPOS_ENCODING, errors="replace"),
+            ESCPOS_FEED_AND_CUT,
+        )
+    )
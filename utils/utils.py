@@ -1,9 +1,67 @@
-from database import SessionLocal
+from typing import Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from database import (
+    WRITE_LSN_COOKIE,
+    WRITE_LSN_HEADER,
+    AsyncSessionLocal,
+    get_read_session,
+)
+from utils.responses import json_response
 
 
 async def get_db():
-    try:
-        db = SessionLocal()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_request_write_lsn(request: Request) -> Optional[str]:
+    """The WAL position of the client's last write, from header or cookie."""
+    write_lsn = request.headers.get(WRITE_LSN_HEADER)
+    if write_lsn is None and WRITE_LSN_COOKIE in request.cookies:
+        # "/" would make the cookie value quoted, so it is stored as "-".
+        write_lsn = request.cookies[WRITE_LSN_COOKIE].replace("-", "/")
+
+    return write_lsn
+
+
+async def get_read_db(request: Request):
+    """Replica session, unless no replica has the client's last write yet."""
+    async with get_read_session(get_request_write_lsn(request)) as db:
         yield db
-    finally:
-        db.close()
+
+
+def set_write_lsn(response: Response, write_lsn: Optional[str]):
+    """Hand the client its write's WAL position, when replicas are in use.
+
+    It is sent both as a header, for clients to echo on their reads, and as
+    a cookie, for clients that keep them.
+    """
+    if write_lsn is None:
+        return
+
+    response.headers[WRITE_LSN_HEADER] = write_lsn
+    response.set_cookie(
+        WRITE_LSN_COOKIE,
+        write_lsn.replace("/", "-"),
+        httponly=True,
+        samesite="lax",
+    )
+
+
+def json_write_response(content, write_lsn: Optional[str], status_code: int):
+    """json_response carrying the WAL position set by set_write_lsn."""
+    response = json_response(content, status_code=status_code)
+    if write_lsn is None:
+        return response
+
+    if not isinstance(response, Response):
+        response = JSONResponse(
+            content=jsonable_encoder(content), status_code=status_code
+        )
+    set_write_lsn(response, write_lsn)
+
+    return response